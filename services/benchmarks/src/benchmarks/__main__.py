@@ -0,0 +1,276 @@
+"""Offline benchmark harness for the orchestrator API and operator.
+
+    python -m benchmarks run --output results/head.json
+    python -m benchmarks compare results/base.json results/head.json
+    python -m benchmarks record-influx --url http://localhost:8086 --token ...
+
+`run` boots the FastAPI app (uvicorn, localhost) and imports the operator handlers
+against a local mongod and fake Kubernetes and InfluxDB API servers, drives the
+scenarios in `workloads.SCENARIOS` and writes throughput/latency percentiles as JSON."""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+MONGO_USER = "root"
+MONGO_PASSWORD = "benchmark"
+
+logger = logging.getLogger("benchmarks")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark scenarios")
+    run.add_argument("--output", default="results/bench.json")
+    run.add_argument("--scenarios", default=None, help="Comma separated (default: all)")
+    run.add_argument("--services", type=int, default=200, help="Service records to seed")
+    run.add_argument("--files", type=int, default=50, help="Files to upload")
+    run.add_argument(
+        "--file-sizes", default="1024,102400,1048576", help="Comma separated sizes in bytes"
+    )
+    run.add_argument("--requests", type=int, default=500, help="Requests per read scenario")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--page-size", type=int, default=10)
+    run.add_argument("--pollers", type=int, default=8, help="Concurrent check_output pollers")
+    run.add_argument("--ticks", type=int, default=5, help="check_output ticks per poller")
+    run.add_argument("--files-per-tick", type=int, default=4)
+    run.add_argument(
+        "--startup-runs", type=int, default=5, help="Fresh processes per cold start scenario"
+    )
+    run.add_argument(
+        "--serialization-runs", type=int, default=20, help="Runs per serialization scenario"
+    )
+    run.add_argument(
+        "--timeseries-days", type=int, default=7, help="Days of 10 s windows streamed as CSV"
+    )
+    run.add_argument("--k8s-latency-ms", type=float, default=5.0)
+    run.add_argument("--influx-latency-ms", type=float, default=20.0)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument(
+        "--mongo-host", default=None, help="Use an existing mongod instead of starting one"
+    )
+    run.add_argument("--mongo-port", type=int, default=27017)
+
+    record = commands.add_parser(
+        "record-influx",
+        help="Record InfluxDB's responses to the queries in fake_influx's recordings",
+    )
+    record.add_argument("--url", default="http://localhost:8086")
+    record.add_argument("--org", default="camdt")
+    record.add_argument("--token", default=os.environ.get("INFLUXDB_TOKEN", ""))
+
+    compare = commands.add_parser("compare", help="Compare two result files")
+    compare.add_argument("base")
+    compare.add_argument("head")
+    compare.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative p95 regression that fails"
+    )
+    return parser.parse_args()
+
+
+def start_api(port: int):
+    """Serve the orchestrator API app with uvicorn in a background thread"""
+    import uvicorn
+    from src.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def run_scenarios(env, names: list[str]) -> dict:
+    import httpx
+
+    from .workloads import SCENARIOS
+
+    results = {}
+    async with httpx.AsyncClient(base_url=env.api_url, timeout=120) as client:
+        for name in names:
+            logger.info(f"running scenario {name}")
+            results[name] = await SCENARIOS[name](env, client)
+    return results
+
+
+def run(args: argparse.Namespace):
+    from .fake_influx import FakeInfluxServer, load_recordings
+    from .fake_k8s import FakeKubernetesServer
+    from .mongo import LocalMongod, free_port
+    from .startup import ROOT_PATH, SERVICES_DIR
+    from .stats import run_metadata
+    from .workloads import SCENARIOS, Environment, Workload, seed_services
+
+    workload = Workload(
+        services=args.services,
+        files=args.files,
+        file_sizes=[int(size) for size in args.file_sizes.split(",")],
+        requests=args.requests,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        pollers=args.pollers,
+        ticks=args.ticks,
+        files_per_tick=args.files_per_tick,
+        startup_runs=args.startup_runs,
+        serialization_runs=args.serialization_runs,
+        timeseries_days=args.timeseries_days,
+        seed=args.seed,
+    )
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+
+    with contextlib.ExitStack() as stack:
+        if args.mongo_host:
+            mongo_host, mongo_port = args.mongo_host, args.mongo_port
+        else:
+            mongod = stack.enter_context(LocalMongod(MONGO_USER, MONGO_PASSWORD))
+            mongo_host, mongo_port = mongod.host, mongod.port
+        fake_k8s = stack.enter_context(FakeKubernetesServer(args.k8s_latency_ms / 1000))
+        fake_influx = stack.enter_context(
+            FakeInfluxServer(
+                latency_s=args.influx_latency_ms / 1000, recordings=load_recordings()
+            )
+        )
+        workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="bench-"))
+        data_dir = os.path.join(workdir, "data")
+        os.makedirs(data_dir)
+        kubeconfig = os.path.join(workdir, "kubeconfig")
+        fake_k8s.write_kubeconfig(kubeconfig)
+        api_port = free_port()
+        api_url = f"http://127.0.0.1:{api_port}"
+
+        # Both services read their configuration from the environment at import time
+        os.environ.update(
+            KUBECONFIG=kubeconfig,
+            MONGO_HOST=mongo_host,
+            MONGO_PORT=str(mongo_port),
+            MONGO_USER=MONGO_USER,
+            MONGO_PASSWORD=MONGO_PASSWORD,
+            OUTPUT_DATA_DIR=data_dir,
+            ORCHESTRATOR_API_URL=f"{api_url}{ROOT_PATH}",
+            INFLUXDB_URL=fake_influx.url,
+        )
+        # Neither service is an installable package
+        sys.path[:0] = [
+            str(SERVICES_DIR / "orchestrator_api"),
+            str(SERVICES_DIR / "orchestrator" / "src"),
+        ]
+        from kubernetes import config as k8s_config
+        from pymongo import MongoClient
+
+        # The operator's Kubernetes client uses the default configuration (set by kopf's login handler in-cluster)
+        k8s_config.load_kube_config(config_file=kubeconfig)
+        server, thread = start_api(api_port)
+
+        mongo = MongoClient(
+            host=mongo_host, port=mongo_port, username=MONGO_USER, password=MONGO_PASSWORD
+        )
+        stack.callback(mongo.close)
+        # Start from empty databases so that runs are comparable
+        mongo.drop_database("orchestrator")
+        mongo.drop_database("orchestrator_files")
+
+        env = Environment(
+            api_url=api_url,
+            mongo=mongo,
+            k8s=fake_k8s.api,
+            influx=fake_influx.api,
+            data_dir=data_dir,
+            workload=workload,
+            rng=random.Random(args.seed),
+        )
+        seed_services(env)
+        try:
+            results = asyncio.run(run_scenarios(env, names))
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    output = {
+        "meta": run_metadata(
+            {
+                **asdict(workload),
+                "k8s_latency_ms": args.k8s_latency_ms,
+                "influx_latency_ms": args.influx_latency_ms,
+                "scenarios": names,
+            }
+        ),
+        "results": results,
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+def record_influx(args: argparse.Namespace):
+    """Send the API's query for each recording to a real InfluxDB and store the
+    response as the recording"""
+    import datetime
+
+    import httpx
+
+    from .fake_influx import RECORDINGS_DIR, load_recordings
+    from .startup import SERVICES_DIR
+
+    sys.path.insert(0, str(SERVICES_DIR / "orchestrator_api"))
+    from src.timeseries import TimeseriesQuery
+
+    for recording in load_recordings():
+        query = recording.query
+        flux = TimeseriesQuery(
+            measurement=query["measurement"],
+            field=query["field"],
+            start=datetime.datetime.fromisoformat(query["start"]),
+            stop=datetime.datetime.fromisoformat(query["stop"]),
+            every=query["every"],
+            machines=tuple(sorted(query["machines"])),
+        ).flux(query["bucket"])
+        response = httpx.post(
+            f"{args.url}/api/v2/query",
+            params={"org": args.org},
+            headers={"Authorization": f"Token {args.token}", "Accept": "application/csv"},
+            # As sent by the API's InfluxClient
+            json={
+                "query": flux,
+                "type": "flux",
+                "dialect": {"header": True, "annotations": [], "delimiter": ","},
+            },
+            timeout=60,
+        )
+        response.raise_for_status()
+        (RECORDINGS_DIR / f"{recording.name}.csv").write_bytes(response.content)
+        logger.info(f"Recorded {recording.name} ({len(response.content)} bytes)")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "record-influx":
+        record_influx(args)
+    else:
+        from .stats import compare, load
+
+        lines, regressed = compare(load(args.base), load(args.head), args.threshold)
+        print("\n".join(lines))
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
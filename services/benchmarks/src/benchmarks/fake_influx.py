@@ -0,0 +1,186 @@
+"""A minimal stand-in for the InfluxDB v2 query API.
+
+Answers the downsampled queries of the orchestrator API's `/timeseries` routes with
+rows in the format InfluxDB returns them (CSV without annotations): one row per
+machine and window of the queried range, with synthetic readings. The range, window
+length and machines are read from the Flux query. Every request is delayed by a
+configurable latency to mimic the time InfluxDB takes to aggregate.
+
+Queries matching a recording in `recordings/` are answered with its response instead:
+`<name>.json` describes the query (the parameters of the `/timeseries` request) and
+`<name>.csv` holds the response body. The committed `temperature_hour.csv` is a
+hand-written fixture in InfluxDB 2.7's CSV format, not a response of a real InfluxDB,
+so the API's Flux query is not verified by it; `python -m benchmarks record-influx`
+replaces the fixtures with the responses of a real InfluxDB."""
+
+import datetime
+import json
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RANGE = re.compile(r"range\(start: (\S+), stop: (\S+)\)")
+EVERY = re.compile(r"aggregateWindow\(every: (\d+)s")
+MACHINE = re.compile(r'r\.machine == "([^"]*)"')
+SERIES = re.compile(r'r\._measurement == "([^"]*)" and r\._field == "([^"]*)"')
+HEADER = ",result,table,_time,machine,mean,min,max,count"
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+
+# Measurement, field, start, stop, window length and machines of a query
+QueryKey = tuple[str, str, float, float, int, tuple[str, ...]]
+
+
+def parse_time(value: str) -> float:
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def query_key(flux: str) -> QueryKey | None:
+    series = SERIES.search(flux)
+    range_match, every_match = RANGE.search(flux), EVERY.search(flux)
+    if series is None or range_match is None or every_match is None:
+        return None
+    start, stop = (parse_time(value) for value in range_match.groups())
+    return (
+        *series.groups(),
+        start,
+        stop,
+        int(every_match.group(1)),
+        tuple(sorted(MACHINE.findall(flux))),
+    )
+
+
+@dataclass
+class Recording:
+    name: str
+    query: dict
+    """Parameters of the `/timeseries` request (measurement, field, start, stop, every,
+    machines) and the bucket to query"""
+
+    body: bytes
+    """Response body for the API's query for them (hand-written unless recorded with
+    `record-influx`)"""
+
+    @property
+    def key(self) -> QueryKey:
+        return (
+            self.query["measurement"],
+            self.query["field"],
+            parse_time(self.query["start"]),
+            parse_time(self.query["stop"]),
+            self.query["every"],
+            tuple(sorted(self.query["machines"])),
+        )
+
+
+def load_recordings(directory: Path = RECORDINGS_DIR) -> list[Recording]:
+    return [
+        Recording(
+            name=path.stem,
+            query=json.loads(path.read_text()),
+            body=path.with_suffix(".csv").read_bytes(),
+        )
+        for path in sorted(directory.glob("*.json"))
+    ]
+
+
+class FakeInfluxApi:
+    def __init__(
+        self,
+        machines: int = 10,
+        latency_s: float = 0.0,
+        recordings: list[Recording] | None = None,
+    ):
+        self.machines = [f"machine-{i}" for i in range(machines)]
+        self.latency_s = latency_s
+        self.recordings = {recording.key: recording for recording in recordings or []}
+        self.lock = threading.Lock()
+        self.query_count = 0
+
+    def rows(self, flux: str):
+        """CSV lines answering `flux`; raises ValueError if it isn't a downsampled query"""
+        range_match, every_match = RANGE.search(flux), EVERY.search(flux)
+        if range_match is None or every_match is None:
+            raise ValueError("not a downsampled query")
+        start, stop = (parse_time(value) for value in range_match.groups())
+        every = int(every_match.group(1))
+        machines = MACHINE.findall(flux) or self.machines
+        windows = range(math.floor(start / every) * every, math.ceil(stop), every)
+
+        yield HEADER
+        for machine in machines:
+            for window in windows:
+                # A daily cycle around 20 degrees
+                mean = 20 + 3 * math.sin(2 * math.pi * window / 86400)
+                timestamp = datetime.datetime.fromtimestamp(window, datetime.timezone.utc)
+                yield (
+                    f",_result,0,{timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')},{machine},"
+                    f"{mean},{mean - 0.5},{mean + 0.5},{max(1, every // 10)}"
+                )
+
+    def query(self, flux: str) -> tuple[int, str, bytes]:
+        with self.lock:
+            self.query_count += 1
+        time.sleep(self.latency_s)
+        recording = self.recordings.get(query_key(flux))
+        if recording is not None:
+            return 200, "text/csv; charset=utf-8", recording.body
+        try:
+            body = "\n".join(self.rows(flux)) + "\n"
+        except ValueError as e:
+            return 400, "application/json", json.dumps({"code": "invalid", "message": str(e)}).encode()
+        return 200, "text/csv; charset=utf-8", body.encode()
+
+
+def make_handler(api: FakeInfluxApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.startswith("/api/v2/query"):
+                status, content_type, body = 404, "application/json", b'{"code": "not found"}'
+            else:
+                status, content_type, body = api.query(request.get("query", ""))
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class FakeInfluxServer:
+    """Serves a `FakeInfluxApi` on localhost in a background thread"""
+
+    def __init__(
+        self,
+        machines: int = 10,
+        latency_s: float = 0.0,
+        recordings: list[Recording] | None = None,
+    ):
+        self.api = FakeInfluxApi(machines, latency_s, recordings)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.api))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,184 @@
+"""A minimal in-memory stand-in for the Kubernetes API server.
+
+Objects are stored by their collection path (e.g. `/apis/batch/v1/namespaces/default/jobs`)
+and name, which is enough for the create/read/list/patch/delete calls made by the
+orchestrator API and operator. Every request is delayed by a configurable latency to
+mimic a remote API server."""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+SELECTOR_REQUIREMENT = re.compile(r"\s*([^,=\s]+)\s*(?:in\s*\(([^)]*)\)|=\s*([^,]*))?\s*(?:,|$)")
+
+
+def matches_selector(obj: dict, label_selector: str | None) -> bool:
+    """Equality-based, set-based (`in`) and existence label selector
+    (`key=value,key2 in (a,b),key3`)"""
+    if not label_selector:
+        return True
+    labels = obj.get("metadata", {}).get("labels") or {}
+    for key, values, value in SELECTOR_REQUIREMENT.findall(label_selector):
+        if key not in labels:
+            return False
+        if values and labels[key] not in {v.strip() for v in values.split(",")}:
+            return False
+        if value and labels[key] != value.strip():
+            return False
+    return True
+
+
+def split_path(path: str) -> tuple[str, str | None]:
+    """Split a resource path into its collection path and object name (if any).
+
+    `/apis/batch/v1/namespaces/default/jobs/abc/status` -> (`/apis/batch/v1/namespaces/default/jobs`, `abc`)
+    """
+    segments = path.strip("/").split("/")
+    prefix_length = 2 if segments[0] == "api" else 3
+    prefix, rest = segments[:prefix_length], segments[prefix_length:]
+    resource_length = 3 if rest and rest[0] == "namespaces" and len(rest) >= 3 else 1
+    collection = "/" + "/".join(prefix + rest[:resource_length])
+    name = rest[resource_length] if len(rest) > resource_length else None
+    return collection, name
+
+
+def status_body(code: int, reason: str, message: str) -> dict:
+    return {
+        "apiVersion": "v1",
+        "kind": "Status",
+        "status": "Failure" if code >= 400 else "Success",
+        "reason": reason,
+        "message": message,
+        "code": code,
+    }
+
+
+class FakeKubernetesApi:
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.lock = threading.Lock()
+        self.collections: dict[str, dict[str, dict]] = {}
+        self.request_count = 0
+
+    def put(self, collection: str, obj: dict):
+        """Seed an object (`collection` is the collection path without a trailing slash)"""
+        with self.lock:
+            self.collections.setdefault(collection, {})[obj["metadata"]["name"]] = obj
+
+    def handle(self, method: str, path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+        with self.lock:
+            self.request_count += 1
+            collection, name = split_path(path)
+            objects = self.collections.setdefault(collection, {})
+
+            if method == "GET" and name is None:
+                items = [
+                    obj
+                    for obj in objects.values()
+                    if matches_selector(obj, query.get("labelSelector", [None])[0])
+                ]
+                return 200, {"apiVersion": "v1", "kind": "List", "metadata": {}, "items": items}
+
+            if method == "POST" and name is None:
+                obj_name = body["metadata"]["name"]
+                if obj_name in objects:
+                    return 409, status_body(409, "AlreadyExists", f"{obj_name} already exists")
+                objects[obj_name] = body
+                return 201, body
+
+            if name not in objects:
+                return 404, status_body(404, "NotFound", f"{name} not found")
+
+            if method == "GET":
+                return 200, objects[name]
+            if method == "PATCH":
+                objects[name] = merge(objects[name], body or {})
+                return 200, objects[name]
+            if method == "PUT":
+                objects[name] = body
+                return 200, body
+            if method == "DELETE":
+                del objects[name]
+                return 200, status_body(200, "", f"{name} deleted")
+
+        return 405, status_body(405, "MethodNotAllowed", method)
+
+
+def merge(target: dict, patch: dict) -> dict:
+    """JSON merge patch (RFC 7386)"""
+    result = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def make_handler(api: FakeKubernetesApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self):
+            time.sleep(api.latency_s)
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            code, payload = api.handle(
+                self.command, url.path.rstrip("/"), parse_qs(url.query), body
+            )
+            data = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = do_DELETE = do_PUT = respond
+
+    return Handler
+
+
+class FakeKubernetesServer:
+    """Serves a `FakeKubernetesApi` on localhost in a background thread"""
+
+    def __init__(self, latency_s: float = 0.0):
+        self.api = FakeKubernetesApi(latency_s)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.api))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def write_kubeconfig(self, path: str):
+        """kubeconfig pointing at the fake server (used by `load_config()`)"""
+        kubeconfig = {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+            "users": [{"name": "fake", "user": {"token": "fake"}}],
+            "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+            "current-context": "fake",
+        }
+        with open(path, "w") as f:
+            json.dump(kubeconfig, f)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,68 @@
+"""Throwaway local mongod for benchmark runs"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalMongod:
+    """Starts `mongod` (from PATH or the MONGOD env var) with authentication enabled
+    on a temporary data directory, and creates the root user the services log in with."""
+
+    def __init__(self, username: str, password: str, binary: str | None = None):
+        self.username = username
+        self.password = password
+        self.binary = binary or os.environ.get("MONGOD") or shutil.which("mongod")
+        if not self.binary:
+            raise RuntimeError(
+                "mongod not found: install MongoDB, set MONGOD or pass --mongo-host"
+            )
+        self.host = "127.0.0.1"
+        self.port = free_port()
+        self.dbpath = tempfile.mkdtemp(prefix="bench-mongod-")
+        self.process: subprocess.Popen | None = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [
+                self.binary,
+                "--auth",
+                "--bind_ip", self.host,
+                "--port", str(self.port),
+                "--dbpath", self.dbpath,
+                "--quiet",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        # The localhost exception allows creating the first user without credentials
+        client = MongoClient(self.host, self.port, serverSelectionTimeoutMS=500)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                client.admin.command(
+                    "createUser", self.username, pwd=self.password, roles=["root"]
+                )
+                break
+            except PyMongoError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        client.close()
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+        shutil.rmtree(self.dbpath, ignore_errors=True)
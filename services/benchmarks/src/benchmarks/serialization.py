@@ -0,0 +1,248 @@
+"""Serialization micro-benchmarks: CPU time to turn 1,000 records into the JSON body of
+the list and status endpoints, through the untyped path the endpoints used to take
+(plain dicts, `jsonable_encoder` and `JSONResponse`) and through their response models
+
+    python -m benchmarks.serialization
+
+runs in-process without mongod or Kubernetes (the API must be importable, see
+`SERVICES_DIR`)."""
+
+import asyncio
+import datetime
+import json
+import random
+import sys
+import time
+from typing import Callable
+
+from bson import ObjectId
+
+from .startup import SERVICES_DIR
+from .stats import summarize
+
+RECORDS = 1000
+
+
+def service_documents(rng: random.Random, count: int) -> list[dict]:
+    """Service records as stored by the API and the operator"""
+    return [
+        {
+            "_id": ObjectId(),
+            "namespace": "default",
+            "image": "ghcr.io/cam-digital-hospitals/digital-hosp-des",
+            "version": "latest",
+            "description": "benchmark service",
+            "mount_files": {str(ObjectId()): "input.xlsx"},
+            "output_files": {str(ObjectId()): f"output_{i}.json" for i in range(3)},
+            "run_outputs": {
+                f"run-{run}": {str(ObjectId()): f"output_{run}.json"} for run in range(3)
+            },
+            "reps": 3,
+            "job_type": "ondemand",
+            "created_at": time.time() - rng.randrange(86400),
+        }
+        for _ in range(count)
+    ]
+
+
+def file_documents(rng: random.Random, count: int) -> list[dict]:
+    """Blob catalog (`fs.files`) entries"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "filename": f"bench_{i}.bin",
+            "length": rng.randrange(1 << 20),
+            "uploadDate": now - datetime.timedelta(seconds=rng.randrange(86400)),
+            "metadata": {"hash": rng.randbytes(16).hex(), "encoding": "gzip"},
+        }
+        for i in range(count)
+    ]
+
+
+def run_counts() -> dict:
+    return dict(active_runs=0, succeeded_runs=3, failed_runs=0, total_runs=3, status="ok")
+
+
+def untyped_services(documents: list[dict]) -> list[dict]:
+    return [
+        {
+            "id": str(service.get("_id")),
+            "namespace": service.get("namespace"),
+            "image": service.get("image"),
+            "version": service.get("version"),
+            "description": service.get("description"),
+            "reps": service.get("reps"),
+            "mount_files": service.get("mount_files"),
+            "output_files": service.get("output_files"),
+            "created_at": service.get("created_at"),
+            **run_counts(),
+        }
+        for service in documents
+    ]
+
+
+def untyped_statuses(documents: list[dict]) -> list[dict]:
+    return [
+        {
+            "namespace": service.get("namespace"),
+            **run_counts(),
+            "output_files": list(service.get("output_files").keys()),
+            "run_outputs": {
+                run: list(files.keys()) for run, files in service["run_outputs"].items()
+            },
+        }
+        for service in documents
+    ]
+
+
+def untyped_files(documents: list[dict]) -> list[dict]:
+    return [
+        {
+            "file_id": str(file_doc["_id"]),
+            "filename": file_doc["filename"],
+            "length": file_doc["length"],
+            "uploadDate": file_doc["uploadDate"],
+            "metadata": file_doc.get("metadata"),
+        }
+        for file_doc in documents
+    ]
+
+
+def typed_services(documents: list[dict]) -> list:
+    from src.models import ServiceRuns
+    from src.routes.dt_service import service_summary
+
+    return [service_summary(service, ServiceRuns(**run_counts())) for service in documents]
+
+
+def typed_statuses(documents: list[dict]) -> list:
+    from src.models import ServiceStatusResponse
+
+    return [
+        ServiceStatusResponse(
+            namespace=service["namespace"],
+            output_files=list(service.get("output_files") or {}),
+            run_outputs={
+                run: list(files) for run, files in (service.get("run_outputs") or {}).items()
+            },
+            **run_counts(),
+        )
+        for service in documents
+    ]
+
+
+def typed_files(documents: list[dict]) -> list:
+    from src.models import FileInfo
+
+    return [
+        FileInfo(
+            file_id=str(file_doc["_id"]),
+            filename=file_doc["filename"],
+            length=file_doc["length"],
+            uploadDate=file_doc["uploadDate"],
+            metadata=file_doc.get("metadata"),
+        )
+        for file_doc in documents
+    ]
+
+
+def untyped_bodies(contents: list) -> list[bytes]:
+    """What FastAPI does with the return value of an endpoint without a response model"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    return [JSONResponse(jsonable_encoder(content)).body for content in contents]
+
+
+def typed_serializer(path: str) -> Callable[[list], list[bytes]]:
+    """What FastAPI does with the return value of the endpoint at `path`"""
+    from fastapi.datastructures import DefaultPlaceholder
+    from fastapi.routing import serialize_response
+    from src.routes import dt_service, files
+
+    route = next(
+        route
+        for route in dt_service.router.routes + files.router.routes
+        if route.path == path
+    )
+    # The response model is dumped straight to JSON unless a response class is set
+    dump_json = isinstance(route.response_class, DefaultPlaceholder)
+
+    async def serialize(contents: list) -> list[bytes]:
+        bodies = []
+        for content in contents:
+            body = await serialize_response(
+                field=route.response_field, response_content=content, dump_json=dump_json
+            )
+            bodies.append(body if dump_json else route.response_class(body).body)
+        return bodies
+
+    return lambda contents: asyncio.run(serialize(contents))
+
+
+# Endpoint: (path, Mongo documents, untyped records, typed records, one record per
+# response); responses of the status endpoint hold a single record
+ENDPOINTS = {
+    "list_services": ("/service/", service_documents, untyped_services, typed_services, False),
+    "service_status": (
+        "/service/{id}/status",
+        service_documents,
+        untyped_statuses,
+        typed_statuses,
+        True,
+    ),
+    "list_files": ("/files", file_documents, untyped_files, typed_files, False),
+}
+
+
+def measure(serialize: Callable[[], list[bytes]], runs: int) -> list[float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        serialize()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def serialization_scenario(name: str, runs: int, seed: int = 0) -> dict:
+    """Time to serialize `RECORDS` records, from their Mongo documents to the response
+    bodies, `runs` times; the summary is of the typed path, `untyped` of the old one"""
+    path, documents_factory, untyped, typed, per_record = ENDPOINTS[name]
+    documents = documents_factory(random.Random(seed), RECORDS)
+    typed_bodies = typed_serializer(path)
+
+    def responses(records: list) -> list:
+        return records if per_record else [records]
+
+    def serialize_untyped() -> list[bytes]:
+        return untyped_bodies(responses(untyped(documents)))
+
+    def serialize_typed() -> list[bytes]:
+        return typed_bodies(responses(typed(documents)))
+
+    # Both paths produce the same documents (up to the datetime format)
+    assert [len(json.loads(body)) for body in serialize_untyped()] == [
+        len(json.loads(body)) for body in serialize_typed()
+    ]
+
+    untyped_durations = measure(serialize_untyped, runs)
+    typed_durations = measure(serialize_typed, runs)
+    result = summarize(typed_durations, 0, sum(typed_durations))
+    result["records"] = RECORDS
+    result["untyped"] = summarize(untyped_durations, 0, sum(untyped_durations))
+    result["speedup"] = round(result["untyped"]["p50_ms"] / result["p50_ms"], 2)
+    return result
+
+
+def main():
+    sys.path.insert(0, str(SERVICES_DIR / "orchestrator_api"))
+    print(
+        json.dumps(
+            {name: serialization_scenario(name, runs=20) for name in ENDPOINTS}, indent=2
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
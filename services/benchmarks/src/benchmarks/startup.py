@@ -0,0 +1,109 @@
+"""Cold start scenarios: import time of both services (`python -X importtime`) and
+the API's time to first request, each measured in fresh processes"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from .mongo import free_port
+from .stats import summarize
+
+SERVICES_DIR = Path(__file__).resolve().parents[3]
+ROOT_PATH = "/api/orchestrator/v1alpha1"
+
+# Import-time budgets: `compare` flags a result whose p95 exceeds its budget
+IMPORT_BUDGET_MS = {
+    "api_import": 800,
+    "operator_import": 1500,
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of every `-X importtime` line"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def profile_import(module: str, cwd: Path) -> tuple[float, list[tuple[str, int, int]]]:
+    """Import `module` in a fresh interpreter; returns its cumulative import time in
+    seconds and the per-module profile"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative in modules if name == module)
+    return total / 1e6, modules
+
+
+def import_scenario(name: str, module: str, cwd: Path, runs: int) -> dict:
+    durations, profile = [], []
+    for _ in range(runs):
+        duration, profile = profile_import(module, cwd)
+        durations.append(duration)
+    # Top-level packages by the time spent in their own modules
+    packages: dict[str, int] = {}
+    for module_name, self_us, _ in profile:
+        package = module_name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return {
+        **summarize(durations, 0, sum(durations)),
+        "budget_ms": IMPORT_BUDGET_MS[name],
+        "top_packages_ms": {
+            package: round(self_us / 1000, 1)
+            for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:10]
+        },
+    }
+
+
+def first_request(runs: int) -> dict:
+    """Start the API (`python -m src`) and time its first successful `/healthz` and
+    `/service/` responses"""
+    ready, first = [], []
+    errors = 0
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "src"],
+            cwd=SERVICES_DIR / "orchestrator_api",
+            env={**os.environ, "HOST": "127.0.0.1", "PORT": str(port)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}{ROOT_PATH}") as client:
+                for path, durations in (("/healthz", ready), ("/service/?limit=1", first)):
+                    while True:
+                        if process.poll() is not None or time.perf_counter() - start > 60:
+                            raise RuntimeError("the API did not start")
+                        try:
+                            if client.get(path).status_code == 200:
+                                break
+                        except httpx.TransportError:
+                            pass
+                        time.sleep(0.01)
+                    durations.append(time.perf_counter() - start)
+        except RuntimeError:
+            errors += 1
+        finally:
+            process.terminate()
+            process.wait()
+    return {
+        **summarize(first, errors, sum(first)),
+        "ready_p50_ms": summarize(ready, 0, sum(ready))["p50_ms"],
+    }
@@ -0,0 +1,88 @@
+import json
+import math
+import platform
+import subprocess
+import time
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Throughput and latency percentiles (in milliseconds) of a scenario"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else None,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p90_ms": round(1000 * percentile(values, 90), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+        "max_ms": round(1000 * values[-1], 3) if values else None,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(params: dict) -> dict:
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+
+def compare(base: dict, head: dict, threshold: float) -> tuple[list[str], bool]:
+    """Compare the scenarios of two result files.
+
+    Returns the report lines and whether any scenario's p95 latency regressed by
+    more than `threshold` (relative) or exceeds the scenario's budget."""
+    lines = [
+        f"{'scenario':<24} {'p50 ms':>18} {'p95 ms':>18} {'throughput rps':>22}",
+    ]
+    regressed = False
+    for scenario, head_result in head["results"].items():
+        budget = head_result.get("budget_ms")
+        over_budget = f" over budget ({budget} ms)" if budget and head_result["p95_ms"] > budget else ""
+        regressed = regressed or bool(over_budget)
+        base_result = base["results"].get(scenario)
+        if base_result is None:
+            lines.append(f"{scenario:<24} (new){over_budget}")
+            continue
+
+        def delta(key: str) -> str:
+            old, new = base_result[key], head_result[key]
+            change = (new - old) / old if old else 0.0
+            return f"{old:>8} -> {new:<8} ({change:+.1%})"
+
+        if base_result["p95_ms"] and (
+            head_result["p95_ms"] - base_result["p95_ms"]
+        ) / base_result["p95_ms"] > threshold:
+            regressed = True
+        lines.append(
+            f"{scenario:<24} {delta('p50_ms')} {delta('p95_ms')} {delta('throughput_rps')}"
+            f"{over_budget}"
+        )
+    return lines, regressed
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,424 @@
+"""Benchmark scenarios driving the orchestrator API over HTTP and the operator's
+handlers in-process"""
+
+import asyncio
+import csv
+import datetime
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+from bson import ObjectId
+from pymongo import MongoClient
+
+from . import serialization, startup
+from .fake_influx import FakeInfluxApi, Recording
+from .fake_k8s import FakeKubernetesApi
+from .stats import summarize
+
+logger = logging.getLogger("benchmarks")
+
+JOBS = "/apis/batch/v1/namespaces/default/jobs"
+
+
+@dataclass
+class Workload:
+    services: int = 200
+    files: int = 50
+    file_sizes: list[int] = field(default_factory=lambda: [1024, 100 * 1024, 1024 * 1024])
+    requests: int = 500
+    concurrency: int = 16
+    page_size: int = 10
+    pollers: int = 8
+    ticks: int = 5
+    files_per_tick: int = 4
+    startup_runs: int = 5
+    serialization_runs: int = 20
+    timeseries_days: int = 7
+    seed: int = 0
+
+
+@dataclass
+class Environment:
+    api_url: str
+    mongo: MongoClient
+    k8s: FakeKubernetesApi
+    influx: FakeInfluxApi
+    data_dir: str
+    workload: Workload
+    rng: random.Random
+    service_ids: list[str] = field(default_factory=list)
+    file_ids: list[str] = field(default_factory=list)
+
+
+async def run_concurrently(
+    request: Callable[[int], Awaitable[None]], total: int, concurrency: int
+) -> tuple[list[float], int, float]:
+    """Run `request(i)` for i in range(total) with at most `concurrency` in flight.
+
+    Returns the latencies of the successful requests, the error count and the elapsed time."""
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors += 1
+                logger.debug(f"request {i} failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def seed_services(env: Environment):
+    """Service records and their (finished) Jobs"""
+    services = env.mongo.orchestrator.services
+    records = [
+        {
+            "_id": ObjectId(),
+            "image": "ghcr.io/cam-digital-hospitals/digital-hosp-des",
+            "version": "latest",
+            "description": "benchmark service",
+            "mount_files": {str(ObjectId()): "input.xlsx"},
+            "output_files": {str(ObjectId()): f"output_{i}.json" for i in range(3)},
+            "reps": 3,
+            "job_type": "ondemand",
+            "namespace": "default",
+            "env": {"OUTPUT_FOLDER": "/output"},
+            "created_at": time.time(),
+        }
+        for _ in range(env.workload.services)
+    ]
+    services.insert_many(records)
+    for record in records:
+        name = str(record["_id"])
+        env.k8s.put(
+            JOBS,
+            {
+                "apiVersion": "batch/v1",
+                "kind": "Job",
+                "metadata": {
+                    "name": name,
+                    "namespace": "default",
+                    "labels": {"eng.cam.ac.uk/service": name},
+                },
+                "spec": {"template": {"spec": {"containers": [{"name": "main"}]}}},
+                "status": {"succeeded": 3},
+            },
+        )
+        env.service_ids.append(name)
+
+
+async def list_services(env: Environment, client: httpx.AsyncClient) -> dict:
+    pages = max(1, env.workload.services // env.workload.page_size)
+
+    async def request(i: int):
+        skip = (i % pages) * env.workload.page_size
+        response = await client.get(
+            "/service/", params={"skip": skip, "limit": env.workload.page_size}
+        )
+        response.raise_for_status()
+
+    return summarize(
+        *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+    )
+
+
+async def service_status(env: Environment, client: httpx.AsyncClient) -> dict:
+    async def request(i: int):
+        service_id = env.service_ids[i % len(env.service_ids)]
+        response = await client.get(f"/service/{service_id}/status")
+        response.raise_for_status()
+
+    return summarize(
+        *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+    )
+
+
+def file_contents(workload: Workload) -> list[bytes]:
+    """Deterministic file contents cycling through the configured sizes"""
+    rng = random.Random(workload.seed)
+    sizes = workload.file_sizes
+    return [rng.randbytes(sizes[i % len(sizes)]) for i in range(workload.files)]
+
+
+async def upload_file(env: Environment, client: httpx.AsyncClient) -> dict:
+    """Unique files of every configured size"""
+    contents = file_contents(env.workload)
+
+    async def request(i: int):
+        response = await client.post(
+            "/files/upload", files={"file": (f"bench_{i}.bin", contents[i])}
+        )
+        response.raise_for_status()
+        env.file_ids.append(response.json()["file_id"])
+
+    return summarize(
+        *await run_concurrently(request, len(contents), env.workload.concurrency)
+    )
+
+
+async def upload_file_dedup(env: Environment, client: httpx.AsyncClient) -> dict:
+    """Re-upload of the content stored by `upload_file` (dedup hit path)"""
+    contents = file_contents(env.workload)
+
+    async def request(i: int):
+        response = await client.post(
+            "/files/upload", files={"file": (f"bench_{i}.bin", contents[i])}
+        )
+        response.raise_for_status()
+
+    return summarize(
+        *await run_concurrently(request, len(contents), env.workload.concurrency)
+    )
+
+
+async def get_file(env: Environment, client: httpx.AsyncClient) -> dict:
+    async def request(i: int):
+        file_id = env.file_ids[i % len(env.file_ids)]
+        async with client.stream("GET", f"/files/{file_id}") as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+
+    return summarize(
+        *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+    )
+
+
+async def list_files(env: Environment, client: httpx.AsyncClient) -> dict:
+    async def request(i: int):
+        response = await client.get("/files", params={"limit": env.workload.page_size})
+        response.raise_for_status()
+
+    return summarize(
+        *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+    )
+
+
+async def check_output(env: Environment, client: httpx.AsyncClient) -> dict:
+    """Concurrent `check_output` timer ticks, each finding new output files to upload"""
+    import kopf
+    from orchestrator_operator.main import check_output as check_output_handler
+
+    pollers = env.service_ids[: env.workload.pollers]
+    size = env.workload.file_sizes[0]
+    operator_logger = logging.getLogger("benchmarks.operator")
+
+    def write_outputs(tick: int):
+        for service_id in pollers:
+            for i in range(env.workload.files_per_tick):
+                path = os.path.join(env.data_dir, f"{service_id}-{tick}-{i}.json")
+                with open(path, "wb") as f:
+                    f.write(env.rng.randbytes(size))
+
+    async def request(i: int):
+        service_id = pollers[i % len(pollers)]
+        await check_output_handler(
+            spec={"jobType": "ondemand"},
+            status={},
+            name=service_id,
+            namespace="default",
+            patch=kopf.Patch(),
+            logger=operator_logger,
+        )
+
+    latencies, errors, elapsed = [], 0, 0.0
+    for tick in range(env.workload.ticks):
+        write_outputs(tick)
+        tick_latencies, tick_errors, tick_elapsed = await run_concurrently(
+            request, len(pollers), len(pollers)
+        )
+        latencies += tick_latencies
+        errors += tick_errors
+        elapsed += tick_elapsed
+
+    return {
+        **summarize(latencies, errors, elapsed),
+        "files_per_tick": env.workload.files_per_tick,
+    }
+
+
+async def api_import(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(
+        startup.import_scenario,
+        "api_import",
+        "src.main",
+        startup.SERVICES_DIR / "orchestrator_api",
+        env.workload.startup_runs,
+    )
+
+
+async def operator_import(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(
+        startup.import_scenario,
+        "operator_import",
+        "orchestrator_operator.main",
+        startup.SERVICES_DIR / "orchestrator" / "src",
+        env.workload.startup_runs,
+    )
+
+
+async def api_first_request(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(startup.first_request, env.workload.startup_runs)
+
+
+async def serialize_list_services(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(
+        serialization.serialization_scenario,
+        "list_services",
+        env.workload.serialization_runs,
+        env.workload.seed,
+    )
+
+
+async def serialize_service_status(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(
+        serialization.serialization_scenario,
+        "service_status",
+        env.workload.serialization_runs,
+        env.workload.seed,
+    )
+
+
+async def serialize_list_files(env: Environment, client: httpx.AsyncClient) -> dict:
+    return await asyncio.to_thread(
+        serialization.serialization_scenario,
+        "list_files",
+        env.workload.serialization_runs,
+        env.workload.seed,
+    )
+
+
+async def timeseries_recent(env: Environment, client: httpx.AsyncClient) -> dict:
+    """Dashboards polling the last hour of every machine (1 minute windows); after the
+    first request they are answered from the cache until its TTL expires"""
+    queries = env.influx.query_count
+
+    async def request(i: int):
+        start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        response = await client.get(
+            "/timeseries/temperature_reading/temp",
+            params={"start": start.isoformat(), "every": 60},
+        )
+        response.raise_for_status()
+
+    return {
+        **summarize(
+            *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+        ),
+        "influx_queries": env.influx.query_count - queries,
+    }
+
+
+async def timeseries_stream_csv(env: Environment, client: httpx.AsyncClient) -> dict:
+    """A range of `timeseries_days` at 10 second windows (too large to cache), streamed
+    as CSV"""
+    stop = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    start = stop - datetime.timedelta(days=env.workload.timeseries_days)
+    rows = 0
+
+    async def request(i: int):
+        nonlocal rows
+        async with client.stream(
+            "GET",
+            "/timeseries/temperature_reading/temp",
+            params={
+                "start": start.isoformat(),
+                "stop": stop.isoformat(),
+                "every": 10,
+                "machine": ["machine-0", "machine-1"],
+                "format": "csv",
+            },
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                rows += 1
+
+    requests = max(1, env.workload.requests // 50)
+    result = summarize(*await run_concurrently(request, requests, env.workload.concurrency))
+    result["rows_per_response"] = rows // requests - 1
+    return result
+
+
+def recorded_rows(recording: Recording) -> list[dict]:
+    """Rows of a fixture's InfluxDB response, as the API's JSON response has them"""
+    lines = [line for line in recording.body.decode().splitlines() if line]
+    return [
+        {
+            "time": row["_time"].replace("Z", "+00:00"),
+            "machine": row["machine"] or None,
+            "mean": float(row["mean"]),
+            "min": float(row["min"]),
+            "max": float(row["max"]),
+            "count": int(row["count"]),
+        }
+        for row in csv.DictReader(lines)
+    ]
+
+
+async def timeseries_recorded(env: Environment, client: httpx.AsyncClient) -> dict:
+    """The queries of the InfluxDB fixtures (see `fake_influx`), answered with their
+    responses. Fails if the rows the API returns differ from the fixture's."""
+    recordings = list(env.influx.recordings.values())
+    if not recordings:
+        raise RuntimeError("No InfluxDB fixtures to replay")
+
+    async def request(i: int):
+        recording = recordings[i % len(recordings)]
+        query = recording.query
+        response = await client.get(
+            f"/timeseries/{query['measurement']}/{query['field']}",
+            params={
+                "start": query["start"],
+                "stop": query["stop"],
+                "every": query["every"],
+                "machine": query["machines"],
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    for i, recording in enumerate(recordings):
+        rows = await request(i)
+        for row in rows:
+            row["time"] = datetime.datetime.fromisoformat(row["time"]).isoformat()
+        if rows != recorded_rows(recording):
+            raise AssertionError(f"Rows of {recording.name} differ from the fixture")
+
+    return summarize(
+        *await run_concurrently(request, env.workload.requests, env.workload.concurrency)
+    )
+
+
+# Run in this order: later scenarios use the records/files created by earlier ones
+SCENARIOS: dict[str, Callable[[Environment, httpx.AsyncClient], Awaitable[dict]]] = {
+    "list_services": list_services,
+    "service_status": service_status,
+    "upload_file": upload_file,
+    "upload_file_dedup": upload_file_dedup,
+    "get_file": get_file,
+    "list_files": list_files,
+    "check_output": check_output,
+    "api_import": api_import,
+    "operator_import": operator_import,
+    "api_first_request": api_first_request,
+    "serialize_list_services": serialize_list_services,
+    "serialize_service_status": serialize_service_status,
+    "serialize_list_files": serialize_list_files,
+    "timeseries_recent": timeseries_recent,
+    "timeseries_stream_csv": timeseries_stream_csv,
+    "timeseries_recorded": timeseries_recorded,
+}
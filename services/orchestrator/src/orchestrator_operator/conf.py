@@ -1,9 +1,11 @@
 import os
+import socket
 
 env_get = os.environ.get
 
 PROJECT_GROUP = env_get("PROJECT_GROUP", "eng.cam.ac.uk")
 VERSION = "v1alpha1"
+SERVICE_LABEL = f"{PROJECT_GROUP}/service"
 
 
 MONGO_HOST = env_get("MONGO_HOST", "localhost")
@@ -12,8 +14,73 @@ MONGO_USER = env_get("MONGO_USER", "root")
 MONGO_PASSWORD = env_get("MONGO_PASSWORD", "example")
 MONGO_TIMEOUT_MS = int(env_get("MONGO_TIMEOUT_MS", "5000"))
 
+# Namespace the operator (and the API) is deployed in
+OPERATOR_NAMESPACE = env_get("OPERATOR_NAMESPACE", "default")
+# Namespaces whose Analytics resources are handled (comma-separated, all if empty)
+WATCH_NAMESPACES = [
+    namespace.strip()
+    for namespace in env_get("WATCH_NAMESPACES", "").split(",")
+    if namespace.strip()
+]
 
+ORCHESTRATOR_API_URL = env_get(
+    "ORCHESTRATOR_API_URL",
+    f"http://orchestrator-api-svc.{OPERATOR_NAMESPACE}.svc.cluster.local/api/orchestrator/v1alpha1",
+)
+# Shared volume the analytics jobs write their output files to
+OUTPUT_DATA_DIR = env_get("OUTPUT_DATA_DIR", "/data")
+
+
+
+METRICS_PORT = int(env_get("METRICS_PORT", "9090"))
+
+# Replicas share the Analytics resources through leases in the operator namespace
+POD_NAME = env_get("POD_NAME", socket.gethostname())
+SHARD_LEASE_DURATION_SECONDS = int(env_get("SHARD_LEASE_DURATION_SECONDS", "15"))
+SHARD_RENEW_INTERVAL_SECONDS = float(env_get("SHARD_RENEW_INTERVAL_SECONDS", "5"))
+SHARD_VIRTUAL_NODES = int(env_get("SHARD_VIRTUAL_NODES", "64"))
 
 WATCH_CLIENT_TIMEOUT = int(env_get("WATCH_CLIENT_TIMEOUT", "660"))
 WATCH_SERVER_TIMEOUT = int(env_get("WATCH_SERVER_TIMEOUT", "600"))
 MAX_PARALLEL_JOB_RUNS = int(env_get("WATCH_SERVER_TIMEOUT", "3"))
+
+RPS_METRIC_NAME = env_get("RPS_METRIC_NAME", "http_requests_per_second")
+SCALING_STATUS_INTERVAL = float(env_get("SCALING_STATUS_INTERVAL", "30"))
+# CPU request given to autoscaled containers without one when scaling on CPU utilisation
+AUTOSCALER_DEFAULT_CPU_REQUEST = env_get("AUTOSCALER_DEFAULT_CPU_REQUEST", "100m")
+
+# Finished Jobs are deleted by Kubernetes after this delay (the service record keeps their final status)
+JOB_TTL_SECONDS_AFTER_FINISHED = int(env_get("JOB_TTL_SECONDS_AFTER_FINISHED", "86400"))
+# Garbage collection of unreferenced GridFS blobs, expired services and orphaned resources
+GC_INTERVAL_SECONDS = float(env_get("GC_INTERVAL_SECONDS", "600"))
+GC_BATCH_SIZE = int(env_get("GC_BATCH_SIZE", "500"))
+# Blobs uploaded (or deduplicated) more recently than this are never collected, as
+# they may be about to be referenced by a service launch
+GC_BLOB_GRACE_SECONDS = int(env_get("GC_BLOB_GRACE_SECONDS", "3600"))
+# Finished services are deleted this long after completion (0 keeps them forever)
+SERVICE_RETENTION_SECONDS = int(env_get("SERVICE_RETENTION_SECONDS", "0"))
+# Images launched at least PREPULL_MIN_LAUNCHES times within PREPULL_WINDOW_SECONDS
+# (the PREPULL_MAX_IMAGES most launched) are kept pulled on every node by a DaemonSet
+PREPULL_INTERVAL_SECONDS = float(env_get("PREPULL_INTERVAL_SECONDS", "300"))
+PREPULL_WINDOW_SECONDS = int(env_get("PREPULL_WINDOW_SECONDS", str(7 * 86400)))
+PREPULL_MIN_LAUNCHES = int(env_get("PREPULL_MIN_LAUNCHES", "3"))
+PREPULL_MAX_IMAGES = int(env_get("PREPULL_MAX_IMAGES", "10"))
+# Static busybox copied into the pre-pull pods to run `true` in images without a shell
+PREPULL_HELPER_IMAGE = env_get("PREPULL_HELPER_IMAGE", "busybox:musl")
+# Secrets (in the operator's namespace) for pulling private images in the pre-pull
+# DaemonSet, comma-separated
+PREPULL_IMAGE_PULL_SECRETS = [
+    secret.strip()
+    for secret in env_get("PREPULL_IMAGE_PULL_SECRETS", "").split(",")
+    if secret.strip()
+]
+PAUSE_IMAGE = env_get("PAUSE_IMAGE", "registry.k8s.io/pause:3.9")
+# Idle placeholder pods holding node capacity for the WARM_POOL_IMAGES most launched
+# images (WARM_POOL_SIZE per image, 0 disables the pool). Their priority class ranks
+# below the service pods, which preempt them instead of waiting for capacity.
+WARM_POOL_SIZE = int(env_get("WARM_POOL_SIZE", "0"))
+WARM_POOL_IMAGES = int(env_get("WARM_POOL_IMAGES", "3"))
+WARM_POOL_PRIORITY_CLASS = env_get("WARM_POOL_PRIORITY_CLASS", "orchestrator-warm-pool")
+# Requests of the placeholder pods of images without default resources
+WARM_POOL_CPU_REQUEST = env_get("WARM_POOL_CPU_REQUEST", "500m")
+WARM_POOL_MEMORY_REQUEST = env_get("WARM_POOL_MEMORY_REQUEST", "512Mi")
@@ -1,16 +1,31 @@
-from typing import Generator
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from .conf import MONGO_HOST, MONGO_PASSWORD, MONGO_PORT, MONGO_TIMEOUT_MS, MONGO_USER
+from orchestrator_common.metrics import MongoCommandMetrics
+
+from .metrics import MONGO_COMMAND_DURATION
+
+client: AsyncIOMotorClient | None = None
 
-client = AsyncIOMotorClient(
-    host=MONGO_HOST,
-    port=MONGO_PORT,
-    username=MONGO_USER,
-    password=MONGO_PASSWORD,
-    timeoutMS=MONGO_TIMEOUT_MS,
-)
 
 def get_mongo_client() -> AsyncIOMotorClient:
-    """Dependency for MongoDB client"""
-    return client
\ No newline at end of file
+    """Dependency for MongoDB client (created on first use, i.e. in the startup handler,
+    rather than at import)"""
+    global client
+    if client is None:
+        client = AsyncIOMotorClient(
+            host=MONGO_HOST,
+            port=MONGO_PORT,
+            username=MONGO_USER,
+            password=MONGO_PASSWORD,
+            timeoutMS=MONGO_TIMEOUT_MS,
+            event_listeners=[MongoCommandMetrics(MONGO_COMMAND_DURATION)],
+        )
+    return client
+
+
+def close_mongo_client():
+    global client
+    if client is not None:
+        client.close()
+        client = None
@@ -0,0 +1,250 @@
+"""Garbage collection of file blobs, service records and Analytics resources.
+
+GridFS blobs are shared between services (uploads are deduplicated by hash), so a
+blob is only deleted once no service record references it through `mount_files`
+or `output_files`. Only blobs that were referenced and then released are
+candidates: deleting a service record (here or on termination through the API)
+sets `metadata.released_at` on its blobs, and an upload deduplicated to a blob
+unsets it. Uploads that haven't been used by a service yet are never collected.
+
+The referenced ids are read once per sweep; candidates are then checked against
+them in batches, which keeps the time spent between event loop yields bounded.
+
+Blobs held in GridFS are deleted directly; those in another storage backend of the
+API (`metadata.backend`) are deleted through the API, which owns their bytes."""
+
+import asyncio
+import datetime
+import logging
+import time
+
+import requests
+from bson import ObjectId
+from kubernetes import client as k8s_client
+from kubernetes.client import ApiException
+from motor.core import AgnosticCollection
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+
+from .conf import (
+    GC_BATCH_SIZE,
+    GC_BLOB_GRACE_SECONDS,
+    ORCHESTRATOR_API_URL,
+    PROJECT_GROUP,
+    SERVICE_RETENTION_SECONDS,
+    VERSION,
+)
+from .database import get_mongo_client
+from .kube import get_kubernetes_api, list_analytics_resources
+from .metrics import GC_DELETED, GC_DURATION, GC_RECLAIMED_BYTES
+from .sharding import membership
+
+logger = logging.getLogger(__name__)
+
+
+async def referenced_file_ids(services_collection: AgnosticCollection) -> set[str]:
+    """Ids of the files referenced by any service record (as input or output)"""
+    referenced_ids = {
+        "$concatArrays": [
+            {
+                "$map": {
+                    "input": {"$objectToArray": {"$ifNull": [f"${field}", {}]}},
+                    "in": "$$this.k",
+                }
+            }
+            for field in ("mount_files", "output_files")
+        ]
+    }
+    pipeline = [
+        {"$project": {"file_id": referenced_ids}},
+        {"$unwind": "$file_id"},
+        {"$group": {"_id": "$file_id"}},
+    ]
+    return {doc["_id"] async for doc in services_collection.aggregate(pipeline)}
+
+
+async def release_blobs(client: AsyncIOMotorClient, services: list[dict]):
+    """Mark the blobs of `services` (about to be deleted) as candidates for collection"""
+    file_ids = [
+        ObjectId(file_id)
+        for service in services
+        for field in ("mount_files", "output_files")
+        for file_id in service.get(field) or {}
+        if ObjectId.is_valid(file_id)
+    ]
+    if file_ids:
+        await client.orchestrator_files["fs.files"].update_many(
+            {"_id": {"$in": file_ids}},
+            {"$set": {"metadata.released_at": datetime.datetime.now(datetime.timezone.utc)}},
+        )
+
+
+async def delete_blob(fs: AsyncIOMotorGridFSBucket, doc: dict):
+    if "backend" not in (doc.get("metadata") or {}):
+        await fs.delete(doc["_id"])
+        return
+    response = await asyncio.to_thread(
+        requests.delete, f"{ORCHESTRATOR_API_URL}/files/{doc['_id']}", timeout=30
+    )
+    response.raise_for_status()
+
+
+async def sweep_blobs(client: AsyncIOMotorClient) -> tuple[int, int]:
+    """Delete blobs released longer than the grace period ago and not referenced
+    again since. Returns the number of blobs deleted and the bytes reclaimed."""
+    files_collection: AgnosticCollection = client.orchestrator_files["fs.files"]
+    services_collection: AgnosticCollection = client.orchestrator.services
+    fs = AsyncIOMotorGridFSBucket(client.orchestrator_files)
+
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=GC_BLOB_GRACE_SECONDS
+    )
+    query = {"metadata.released_at": {"$lt": cutoff}}
+    referenced = await referenced_file_ids(services_collection)
+    deleted, reclaimed = 0, 0
+    last_id = None
+    while True:
+        batch_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+        batch = (
+            await files_collection.find(batch_query, {"length": 1, "metadata.backend": 1})
+            .sort("_id", 1)
+            .limit(GC_BATCH_SIZE)
+            .to_list(length=GC_BATCH_SIZE)
+        )
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        in_use = [doc["_id"] for doc in batch if str(doc["_id"]) in referenced]
+        if in_use:
+            # Mounted by another service since; released again with that one
+            await files_collection.update_many(
+                {"_id": {"$in": in_use}}, {"$unset": {"metadata.released_at": ""}}
+            )
+        for doc in batch:
+            if str(doc["_id"]) not in referenced:
+                try:
+                    await delete_blob(fs, doc)
+                except requests.RequestException as e:
+                    logger.warning(f"Could not delete blob {doc['_id']}: {e}")
+                    continue
+                deleted += 1
+                reclaimed += doc.get("length", 0)
+
+        if len(batch) < GC_BATCH_SIZE:
+            break
+
+    return deleted, reclaimed
+
+
+def list_analytics() -> dict[str, str]:
+    """Names of all Analytics resources of the operator, mapped to their namespace"""
+    return {
+        item["metadata"]["name"]: item["metadata"]["namespace"]
+        for item in list_analytics_resources()
+    }
+
+
+def delete_analytics(name: str, namespace: str):
+    """Delete an Analytics resource (its Jobs/Deployments are removed through their owner references)"""
+    api_instance = k8s_client.CustomObjectsApi(get_kubernetes_api())
+    try:
+        api_instance.delete_namespaced_custom_object(
+            group=PROJECT_GROUP,
+            version=VERSION,
+            namespace=namespace,
+            plural="analytics",
+            name=name,
+        )
+    except ApiException as e:
+        if e.status != 404:
+            raise
+
+
+async def sweep_services(client: AsyncIOMotorClient, analytics: dict[str, str]) -> int:
+    """Delete services that finished longer than the retention period ago, along
+    with their Analytics resource. Their blobs are collected by a later blob sweep."""
+    if SERVICE_RETENTION_SECONDS <= 0:
+        return 0
+
+    services_collection: AgnosticCollection = client.orchestrator.services
+    expired = await services_collection.find(
+        {"finished_at": {"$lt": time.time() - SERVICE_RETENTION_SECONDS}},
+        {"_id": 1, "mount_files": 1, "output_files": 1},
+    ).to_list(length=GC_BATCH_SIZE)
+    await release_blobs(client, expired)
+
+    for service in expired:
+        name = str(service["_id"])
+        if name in analytics:
+            delete_analytics(name, analytics.pop(name))
+        await services_collection.delete_one({"_id": service["_id"]})
+        logger.info(f"Deleted expired service {name}")
+
+    return len(expired)
+
+
+async def sweep_resources(client: AsyncIOMotorClient, analytics: dict[str, str]) -> int:
+    """Delete Analytics resources whose service record no longer exists (e.g. when the
+    resource deletion failed on termination), so that their timers stop running"""
+    services_collection: AgnosticCollection = client.orchestrator.services
+    # Resources not created through the API (names that aren't record ids) are left alone
+    names = [name for name in analytics if ObjectId.is_valid(name)]
+    deleted = 0
+    for start in range(0, len(names), GC_BATCH_SIZE):
+        batch = names[start : start + GC_BATCH_SIZE]
+        existing = {
+            str(doc["_id"])
+            async for doc in services_collection.find(
+                {"_id": {"$in": [ObjectId(name) for name in batch]}}, {"_id": 1}
+            )
+        }
+        for name in batch:
+            if name not in existing:
+                delete_analytics(name, analytics[name])
+                logger.info(f"Deleted orphaned Analytics resource {name}")
+                deleted += 1
+
+    return deleted
+
+
+async def collect_garbage() -> dict:
+    """Run one garbage collection sweep and record its report"""
+    client = get_mongo_client()
+    started_at = time.time()
+
+    with GC_DURATION.time():
+        analytics = list_analytics()
+        services_deleted = await sweep_services(client, analytics)
+        resources_deleted = await sweep_resources(client, analytics)
+        blobs_deleted, reclaimed_bytes = await sweep_blobs(client)
+
+    GC_DELETED.labels(kind="service").inc(services_deleted)
+    GC_DELETED.labels(kind="analytics").inc(resources_deleted)
+    GC_DELETED.labels(kind="blob").inc(blobs_deleted)
+    GC_RECLAIMED_BYTES.inc(reclaimed_bytes)
+
+    report = {
+        "started_at": started_at,
+        "duration": time.time() - started_at,
+        "services_deleted": services_deleted,
+        "resources_deleted": resources_deleted,
+        "blobs_deleted": blobs_deleted,
+        "reclaimed_bytes": reclaimed_bytes,
+    }
+    await client.orchestrator.gc_runs.insert_one(dict(report))
+    logger.info(
+        f"Garbage collection: deleted {services_deleted} services, {resources_deleted} "
+        f"orphaned resources and {blobs_deleted} blobs ({reclaimed_bytes} bytes reclaimed)"
+    )
+    return report
+
+
+async def run_garbage_collection(interval: float):
+    while True:
+        try:
+            # A single replica collects (whichever owns this key of the ring)
+            if membership.owns("garbage-collection"):
+                await collect_garbage()
+        except Exception:
+            logger.exception("Garbage collection failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,38 @@
+from kubernetes import client as k8s_client
+from kubernetes import config as k8s_config
+from orchestrator_common.kube import InstrumentedApiClient
+
+from .conf import PROJECT_GROUP, VERSION, WATCH_NAMESPACES
+from .metrics import KUBERNETES_REQUEST_DURATION
+
+
+api_client: InstrumentedApiClient | None = None
+
+
+def get_kubernetes_api() -> k8s_client.ApiClient:
+    """Shared Kubernetes API client.
+
+    Created on first use, which can be before the login handler runs (kopf runs the
+    startup handlers first), so the configuration is loaded here: in-cluster, else
+    from the kubeconfig."""
+    global api_client
+    if api_client is None:
+        k8s_config.load_config()
+        api_client = InstrumentedApiClient(KUBERNETES_REQUEST_DURATION)
+    return api_client
+
+
+def list_analytics_resources() -> list[dict]:
+    """All Analytics resources handled by the operator (in `WATCH_NAMESPACES`, if set)"""
+    api_instance = k8s_client.CustomObjectsApi(get_kubernetes_api())
+    if not WATCH_NAMESPACES:
+        return api_instance.list_cluster_custom_object(
+            group=PROJECT_GROUP, version=VERSION, plural="analytics"
+        ).get("items", [])
+    return [
+        item
+        for namespace in WATCH_NAMESPACES
+        for item in api_instance.list_namespaced_custom_object(
+            group=PROJECT_GROUP, version=VERSION, namespace=namespace, plural="analytics"
+        ).get("items", [])
+    ]
@@ -1,21 +1,58 @@
+import asyncio
 import logging
 import os
+import re
+import time
 
 from bson import ObjectId
 import kopf
 from kubernetes import client as k8s_client
 from kubernetes.client import ApiException
 from motor.core import AgnosticCollection
+from orchestrator_common.metrics import monitor_event_loop_lag, process_start_time
+from prometheus_client import start_http_server
 import requests
 
 from orchestrator_operator.conf import (
+    AUTOSCALER_DEFAULT_CPU_REQUEST,
+    GC_INTERVAL_SECONDS,
+    JOB_TTL_SECONDS_AFTER_FINISHED,
     MAX_PARALLEL_JOB_RUNS,
+    METRICS_PORT,
+    ORCHESTRATOR_API_URL,
+    OUTPUT_DATA_DIR,
+    PREPULL_INTERVAL_SECONDS,
     PROJECT_GROUP,
+    RPS_METRIC_NAME,
+    SCALING_STATUS_INTERVAL,
+    SERVICE_LABEL,
     VERSION,
     WATCH_CLIENT_TIMEOUT,
     WATCH_SERVER_TIMEOUT,
 )
-from orchestrator_operator.database import get_mongo_client
+from orchestrator_operator.database import close_mongo_client, get_mongo_client
+from orchestrator_operator.garbage_collection import run_garbage_collection
+from orchestrator_operator.kube import get_kubernetes_api
+from orchestrator_operator.metrics import (
+    CHECK_OUTPUT_DURATION,
+    CHECK_OUTPUT_FILES_UPLOADED,
+    EVENT_LOOP_LAG,
+    FILES_UPLOADED,
+    LAUNCH_TO_FIRST_OUTPUT,
+    STARTUP_DURATION,
+    UPLOAD_BYTES,
+)
+from orchestrator_operator.pods import build_placement, build_resources, image_name
+from orchestrator_operator.sharding import (
+    ShardedDiffBaseStorage,
+    maintain_membership,
+    membership,
+    owned,
+)
+from orchestrator_operator.warm_start import image_label, run_warm_start
+
+# Strong references to operator-wide background tasks (the event loop only keeps weak ones)
+background_tasks: set[asyncio.Task] = set()
 
 
 @kopf.on.login()
@@ -24,12 +61,13 @@ def login_fn(**kwargs):
 
 
 @kopf.on.startup()
-def startup_tasks(settings: kopf.OperatorSettings, logger, **_):
+async def startup_tasks(settings: kopf.OperatorSettings, logger, **_):
     """Perform all necessary startup tasks here. Keep them lightweight and relevant
     as the other handlers won't be initialized until these tasks are complete"""
     logging.getLogger("aiohttp.access").setLevel(logging.WARN)
     logging.getLogger("httpx").setLevel(logging.WARN)
-    # Running the operator as a standalone
+    # Replicas don't use kopf peering (which keeps a single active instance), they
+    # split the resources between them instead (see sharding.py)
     # https://kopf.readthedocs.io/en/stable/peering/?highlight=standalone#standalone-mode
     settings.peering.standalone = True
     settings.posting.level = logging.WARNING
@@ -43,6 +81,43 @@ def startup_tasks(settings: kopf.OperatorSettings, logger, **_):
     settings.persistence.progress_storage = kopf.AnnotationsProgressStorage(
         prefix=PROJECT_GROUP
     )
+    settings.persistence.diffbase_storage = ShardedDiffBaseStorage()
+
+    # Connect before the handlers run
+    get_mongo_client()
+    # Join the other replicas before the resources are listed
+    await asyncio.to_thread(membership.heartbeat)
+    background_tasks.add(asyncio.get_running_loop().create_task(maintain_membership()))
+
+    # Prometheus /metrics (served in a background thread, kopf serves the liveness endpoint)
+    start_http_server(METRICS_PORT)
+    background_tasks.add(asyncio.get_running_loop().create_task(monitor_event_loop_lag(EVENT_LOOP_LAG)))
+    if GC_INTERVAL_SECONDS > 0:
+        background_tasks.add(
+            asyncio.get_running_loop().create_task(
+                run_garbage_collection(GC_INTERVAL_SECONDS)
+            )
+        )
+    if PREPULL_INTERVAL_SECONDS > 0:
+        background_tasks.add(
+            asyncio.get_running_loop().create_task(
+                run_warm_start(PREPULL_INTERVAL_SECONDS)
+            )
+        )
+    STARTUP_DURATION.set(time.time() - process_start_time())
+
+
+@kopf.on.cleanup()
+async def cleanup_tasks(logger, **_):
+    # Stopped first, as their next MongoDB call would reconnect the client closed below
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # The other replicas take over this replica's resources on their next heartbeat
+    await asyncio.to_thread(membership.release_lease)
+    close_mongo_client()
+
 
 def upload_file_to_endpoint(file_path, endpoint_url, logger):
     # logger.debug(f"opening file {file_path}")
@@ -52,15 +127,78 @@ def upload_file_to_endpoint(file_path, endpoint_url, logger):
         # logger.info(f"file upload response: {response}")
         if response.status_code == 200:
             logger.info(f"File {file_path} uploaded successfully.")
+            UPLOAD_BYTES.inc(os.path.getsize(file_path))
             return response.json().get('file_id')
         else:
             logger.info(f"Failed to upload file {file_path}. Status code: {response.status_code}, Response: {response.text}")
             return None
 
-@kopf.timer(PROJECT_GROUP, VERSION, "analytics", interval=10.0)
-async def check_output(spec: kopf.Spec, status: kopf.Status, name, namespace, logger: logging.Logger, **kwargs):
+@kopf.timer(
+    PROJECT_GROUP,
+    VERSION,
+    "analytics",
+    interval=10.0,
+    # Stops once all outputs of a finished service are collected
+    when=kopf.all_([owned, lambda status, **_: not status.get("outputCollected")]),
+)
+async def check_output(spec: kopf.Spec, status: kopf.Status, name, namespace, patch: kopf.Patch, logger: logging.Logger, **kwargs):
     job_type = spec.get('jobType')
 
+    with CHECK_OUTPUT_DURATION.labels(job_type=job_type).time():
+        uploaded, complete = await collect_output(job_type, name, namespace, logger)
+    if complete:
+        logger.info(f"All outputs of {name} collected.")
+        patch.status["outputCollected"] = True
+
+    CHECK_OUTPUT_FILES_UPLOADED.labels(job_type=job_type).observe(uploaded)
+    FILES_UPLOADED.labels(job_type=job_type).inc(uploaded)
+
+
+async def record_job_completion(
+    services_collection: AgnosticCollection, name: str, namespace: str, logger: logging.Logger
+):
+    """Persist the final run counts of a finished Job in the service record.
+
+    Finished Jobs are deleted after `ttlSecondsAfterFinished`; the record then remains
+    the source of the service status, and `finished_at` drives the service retention."""
+    batch_api = k8s_client.BatchV1Api(get_kubernetes_api())
+    try:
+        job = batch_api.read_namespaced_job(name=name, namespace=namespace)
+    except ApiException as e:
+        if e.status == 404:
+            return
+        raise
+
+    finished = any(
+        condition.type in ("Complete", "Failed") and condition.status == "True"
+        for condition in job.status.conditions or []
+    )
+    if finished:
+        logger.info(f"Job {name} finished.")
+        await services_collection.update_one(
+            {"_id": ObjectId(name)},
+            {
+                "$set": {
+                    "finished_at": time.time(),
+                    "job_status": {
+                        "active": job.status.active or 0,
+                        "succeeded": job.status.succeeded or 0,
+                        "failed": job.status.failed or 0,
+                    },
+                }
+            },
+        )
+
+
+async def collect_output(
+    job_type: str, name: str, namespace: str, logger: logging.Logger
+) -> tuple[int, bool]:
+    """Upload the output files of a service found on the shared volume.
+
+    Returns the number of files uploaded and whether the collection is complete (an
+    ondemand service that had finished before this collection, or was terminated)."""
+    uploaded = 0
+
     if job_type == "ondemand":
         # batch_api = k8s_client.BatchV1Api()
         # core_api = k8s_client.CoreV1Api()
@@ -83,25 +221,275 @@ async def check_output(spec: kopf.Spec, status: kopf.Status, name, namespace, lo
         services_collection: AgnosticCollection = mongo_client.orchestrator.services
         
         service = await services_collection.find_one({"_id": ObjectId(name)})
+        if not service:
+            # Terminated; the resource itself is removed by the garbage collector
+            logger.info(f"Service id: {name} not found in database, skipping.")
+            return uploaded, True
         file_ids = service.get('output_files')
         
         if not file_ids:
             file_ids = {}
         
-        for file in os.listdir('/data'):
-            filepath = os.path.join("/data", file)
+        for file in os.listdir(OUTPUT_DATA_DIR):
+            filepath = os.path.join(OUTPUT_DATA_DIR, file)
             if name in filepath:
                 logger.info(f"uploading file: {filepath}")
-                endpoint_url = "http://orchestrator-api-svc.default.svc.cluster.local/api/orchestrator/v1alpha1/files/upload"
+                endpoint_url = f"{ORCHESTRATOR_API_URL}/files/upload"
                 file_id = upload_file_to_endpoint(filepath, endpoint_url, logger)
                 if file_id:
                     file_ids.update({file_id: file})
                     os.remove(filepath)
+                    uploaded += 1
         
-        await services_collection.update_one({"_id": ObjectId(name)}, {"$set": {"output_files": file_ids}})
+        if uploaded:
+            updates = {"output_files": file_ids}
+            if not service.get("output_files"):
+                # Launch-to-first-output latency (to within the timer interval)
+                updates["first_output_at"] = time.time()
+                if service.get("created_at"):
+                    LAUNCH_TO_FIRST_OUTPUT.labels(
+                        image=image_label(service.get("image"))
+                    ).observe(updates["first_output_at"] - service["created_at"])
+            await services_collection.update_one({"_id": ObjectId(name)}, {"$set": updates})
+
+        if not service.get("finished_at"):
+            await record_job_completion(services_collection, name, namespace, logger)
+        elif not uploaded:
+            # The Job had written all its outputs when it finished, and they are in
+            return uploaded, True
+
+    elif job_type == "scheduled":
+        mongo_client = get_mongo_client()
+        services_collection: AgnosticCollection = mongo_client.orchestrator.services
+        if not await services_collection.find_one({"_id": ObjectId(name)}, {"_id": 1}):
+            # Terminated; the resource itself is removed by the garbage collector
+            logger.info(f"Service id: {name} not found in database, skipping.")
+            return uploaded, False
+
+        # Each run is a Job named `<name>-<scheduled time>` whose pod, named
+        # `<job name>-<suffix>`, is the RUN_ID that is part of each output file name.
+        # The run is read from there, as the pods of old runs are removed with their
+        # Jobs (history limits).
+        run_pattern = re.compile(rf"{re.escape(name)}-\d+(?=-[a-z0-9]+)")
 
-@kopf.on.create(PROJECT_GROUP, VERSION, "analytics")
-@kopf.on.resume(PROJECT_GROUP, VERSION, "analytics")
+        # Only files that have not been collected yet are still on the volume,
+        # so every tick is an incremental update keyed by the spawned Job name
+        updates = {}
+        for file in os.listdir(OUTPUT_DATA_DIR):
+            filepath = os.path.join(OUTPUT_DATA_DIR, file)
+            if name not in filepath:
+                continue
+            run = run_pattern.search(file)
+            logger.info(f"uploading file: {filepath} (run: {run[0] if run else 'unknown'})")
+            endpoint_url = f"{ORCHESTRATOR_API_URL}/files/upload"
+            file_id = upload_file_to_endpoint(filepath, endpoint_url, logger)
+            if file_id:
+                updates[f"output_files.{file_id}"] = file
+                if run:
+                    updates[f"run_outputs.{run[0]}.{file_id}"] = file
+                os.remove(filepath)
+                uploaded += 1
+
+        if updates:
+            await services_collection.update_one({"_id": ObjectId(name)}, {"$set": updates})
+
+    return uploaded, False
+
+
+def build_job_spec(
+    name: str,
+    reps: int,
+    container_spec: k8s_client.V1Container,
+    mount_files: dict,
+    placement: dict,
+    ttl_seconds_after_finished: int | None,
+) -> k8s_client.V1JobSpec:
+    """Job spec shared by ondemand Jobs and the job template of scheduled CronJobs"""
+    return k8s_client.V1JobSpec(
+        parallelism=MAX_PARALLEL_JOB_RUNS,
+        completions=reps,
+        ttl_seconds_after_finished=ttl_seconds_after_finished,
+        template=k8s_client.V1PodTemplateSpec(
+            metadata=k8s_client.V1ObjectMeta(labels={SERVICE_LABEL: name}),
+            spec=k8s_client.V1PodSpec(
+                init_containers=[
+                    # Init container that prepares input files for the analytics module
+                    # Improvement: a dedicated service the can handle failures and
+                    # directly accesses the DS for files.
+                    k8s_client.V1Container(
+                        name="init-download-files",
+                        image="curlimages/curl",
+                        command=["/bin/sh", "-c"],
+                        args=[
+                            " && ".join(
+                                [
+                                    f"curl -o /input/{file_path} {ORCHESTRATOR_API_URL}/files/{file_id}"
+                                    for file_id, file_path in mount_files.items()
+                                ]
+                            )
+                        ],
+                        volume_mounts=[
+                            k8s_client.V1VolumeMount(
+                                name="shared-data", mount_path="/input"
+                            )
+                        ],
+                    )
+                ],
+                containers=[
+                    container_spec,
+                ],
+                restart_policy="Never",
+                **placement,
+                volumes=[
+                    k8s_client.V1Volume(
+                        name="shared-data",
+                        empty_dir=k8s_client.V1EmptyDirVolumeSource(),
+                    ),
+                    k8s_client.V1Volume(
+                        name="output-data",
+                        persistent_volume_claim=k8s_client.V1PersistentVolumeClaimVolumeSource(
+                            claim_name="orchestrator-pvc"
+                        ),
+                    ),
+                ],
+            ),
+        ),
+    )
+
+
+def create_if_missing(create, kind: str, name: str, logger: logging.Logger, **kwargs):
+    """Call `create`, tolerating an object left by an earlier (retried or resumed)
+    run of the handler"""
+    try:
+        create(**kwargs)
+    except ApiException as e:
+        if e.status != 409:
+            raise kopf.TemporaryError(f"Unknown error: {e}")
+        logger.info(f"{kind} {name} already exists.")
+
+
+def uses_cpu_target(spec: dict) -> bool:
+    """Whether the autoscaler of a persistent service scales on CPU utilisation (the
+    default without a requests per second target)"""
+    return bool(
+        spec.get("targetCPUUtilizationPercentage") or not spec.get("targetRequestsPerSecond")
+    )
+
+
+def build_autoscaler(
+    name: str,
+    namespace: str,
+    spec: dict,
+    min_replicas: int,
+    max_replicas: int,
+    owner_reference: k8s_client.V1OwnerReference,
+) -> k8s_client.V2HorizontalPodAutoscaler:
+    """HorizontalPodAutoscaler scaling the Deployment of a persistent service on
+    CPU utilisation and/or requests per second (defaults to 80% CPU)"""
+    metrics = []
+    target_rps = spec.get("targetRequestsPerSecond")
+    target_cpu = spec.get("targetCPUUtilizationPercentage")
+    if uses_cpu_target(spec):
+        metrics.append(
+            k8s_client.V2MetricSpec(
+                type="Resource",
+                resource=k8s_client.V2ResourceMetricSource(
+                    name="cpu",
+                    target=k8s_client.V2MetricTarget(
+                        type="Utilization", average_utilization=target_cpu or 80
+                    ),
+                ),
+            )
+        )
+    if target_rps:
+        # Per-pod custom metric, served by a custom metrics adapter (e.g. prometheus-adapter)
+        metrics.append(
+            k8s_client.V2MetricSpec(
+                type="Pods",
+                pods=k8s_client.V2PodsMetricSource(
+                    metric=k8s_client.V2MetricIdentifier(name=RPS_METRIC_NAME),
+                    target=k8s_client.V2MetricTarget(
+                        type="AverageValue", average_value=str(target_rps)
+                    ),
+                ),
+            )
+        )
+
+    return k8s_client.V2HorizontalPodAutoscaler(
+        api_version="autoscaling/v2",
+        kind="HorizontalPodAutoscaler",
+        metadata=k8s_client.V1ObjectMeta(
+            name=name, namespace=namespace, owner_references=[owner_reference]
+        ),
+        spec=k8s_client.V2HorizontalPodAutoscalerSpec(
+            scale_target_ref=k8s_client.V2CrossVersionObjectReference(
+                api_version="apps/v1", kind="Deployment", name=name
+            ),
+            min_replicas=min_replicas,
+            max_replicas=max_replicas,
+            metrics=metrics,
+        ),
+    )
+
+
+@kopf.timer(
+    PROJECT_GROUP,
+    VERSION,
+    "analytics",
+    interval=SCALING_STATUS_INTERVAL,
+    when=kopf.all_([
+        owned,
+        lambda spec, **_: spec.get("jobType") == "persistent" and spec.get("maxReplicas"),
+    ]),
+)
+async def check_scaling(
+    status: kopf.Status,
+    name,
+    namespace,
+    patch: kopf.Patch,
+    logger: logging.Logger,
+    **kwargs,
+):
+    """Surface the autoscaler's decisions of a persistent service in the resource status"""
+    autoscaling_api = k8s_client.AutoscalingV2Api(get_kubernetes_api())
+    try:
+        hpa = autoscaling_api.read_namespaced_horizontal_pod_autoscaler(
+            name=name, namespace=namespace
+        )
+    except ApiException as e:
+        if e.status == 404:
+            logger.info(f"HorizontalPodAutoscaler {name} not found.")
+            return
+        raise
+
+    scaling = {
+        "currentReplicas": hpa.status.current_replicas,
+        "desiredReplicas": hpa.status.desired_replicas,
+        "lastScaleTime": (
+            hpa.status.last_scale_time.isoformat() if hpa.status.last_scale_time else None
+        ),
+        "conditions": [
+            {
+                "type": condition.type,
+                "status": condition.status,
+                "reason": condition.reason,
+                "message": condition.message,
+            }
+            for condition in hpa.status.conditions or []
+        ],
+    }
+
+    previous = status.get("scaling") or {}
+    if previous.get("desiredReplicas") != scaling["desiredReplicas"]:
+        logger.info(
+            f"Scaling {name}: {previous.get('desiredReplicas')} -> {scaling['desiredReplicas']} replicas"
+        )
+    if scaling != previous:
+        patch.status["scaling"] = scaling
+
+
+@kopf.on.create(PROJECT_GROUP, VERSION, "analytics", when=owned)
+@kopf.on.resume(PROJECT_GROUP, VERSION, "analytics", when=owned)
 async def analytics_handler(
     spec: kopf.Spec,
     name: str,
@@ -117,6 +505,9 @@ async def analytics_handler(
     schedule = spec.get("schedule")
     reps = spec.get("reps")
     env_vars = spec.get("env", {})
+    ttl_seconds_after_finished = spec.get(
+        "ttlSecondsAfterFinished", JOB_TTL_SECONDS_AFTER_FINISHED
+    )
 
     owner_reference = k8s_client.V1OwnerReference(
         api_version=f"{PROJECT_GROUP}/{VERSION}",
@@ -140,10 +531,26 @@ async def analytics_handler(
     # Files to be mounted to the container
     mount_files = result["mount_files"] if result["mount_files"] else {}
 
+    # Per-image defaults (e.g. CPU-heavy DES images spread across nodes);
+    # anything set on the resource itself takes precedence
+    image_defaults = await mongo_client.orchestrator.image_defaults.find_one(
+        {"_id": image_name(image)}
+    )
+    pod_spec = {
+        **{
+            key: image_defaults[key]
+            for key in ("resources", "nodeSelector", "tolerations", "podAntiAffinity")
+            if image_defaults and image_defaults.get(key)
+        },
+        **spec,
+    }
+    placement = build_placement(name, pod_spec)
+
     container_spec = k8s_client.V1Container(
         name="main",
         image=image,
         image_pull_policy="IfNotPresent",
+        resources=build_resources(pod_spec),
         env=[
             # Improvement: create access-restricted user credentials
             # that gives access to only the table/collections the service
@@ -177,7 +584,7 @@ async def analytics_handler(
     )
 
     if job_type == "ondemand":
-        batch_api = k8s_client.BatchV1Api()
+        batch_api = k8s_client.BatchV1Api(get_kubernetes_api())
         try:
             existing_job = batch_api.read_namespaced_job(name=name, namespace=namespace)
             print(f"Job {name} already exists.")
@@ -189,55 +596,72 @@ async def analytics_handler(
                     body=k8s_client.V1Job(
                         api_version="batch/v1",
                         kind="Job",
+                        metadata=k8s_client.V1ObjectMeta(
+                            name=name,
+                            labels={SERVICE_LABEL: name},
+                            owner_references=[owner_reference],
+                        ),
+                        spec=build_job_spec(
+                            name,
+                            reps,
+                            container_spec,
+                            mount_files,
+                            placement,
+                            ttl_seconds_after_finished,
+                        ),
+                    ),
+                )
+            else:
+                raise kopf.TemporaryError(f"Unknown error: {e}")
+
+        return {"job_creation": True}
+
+    elif job_type == "scheduled":
+        batch_api = k8s_client.BatchV1Api(get_kubernetes_api())
+        try:
+            batch_api.read_namespaced_cron_job(
+                name=name, namespace=namespace
+            )
+            logger.info(f"CronJob {name} already exists.")
+        except ApiException as e:
+            if e.status == 404:
+                # CronJob does not exist, proceed to create it.
+                # Each scheduled run spawns a Job named `<name>-<timestamp>`
+                batch_api.create_namespaced_cron_job(
+                    namespace=namespace,
+                    body=k8s_client.V1CronJob(
+                        api_version="batch/v1",
+                        kind="CronJob",
                         metadata=k8s_client.V1ObjectMeta(
                             name=name, owner_references=[owner_reference]
                         ),
-                        spec=k8s_client.V1JobSpec(
-                            parallelism=MAX_PARALLEL_JOB_RUNS,
-                            completions=reps,
-                            template=k8s_client.V1PodTemplateSpec(
-                                spec=k8s_client.V1PodSpec(
-                                    init_containers=[
-                                        # Init container that prepares input files for the analytics module
-                                        # Improvement: a dedicated service the can handle failures and
-                                        # directly accesses the DS for files.
-                                        k8s_client.V1Container(
-                                            name="init-download-files",
-                                            image="curlimages/curl",
-                                            command=["/bin/sh", "-c"],
-                                            args=[
-                                                " && ".join(
-                                                    [
-                                                        f"curl -o /input/{file_path} http://orchestrator-api-svc.default.svc.cluster.local/files/{file_id}"
-                                                        for file_id, file_path in mount_files.items()
-                                                    ]
-                                                )
-                                            ],
-                                            volume_mounts=[
-                                                k8s_client.V1VolumeMount(
-                                                    name="shared-data", mount_path="/input"
-                                                )
-                                            ],
-                                        )
-                                    ],
-                                    containers=[
-                                        container_spec,
-                                    ],
-                                    restart_policy="Never",
-                                    volumes=[
-                                        k8s_client.V1Volume(
-                                            name="shared-data",
-                                            empty_dir=k8s_client.V1EmptyDirVolumeSource(),
-                                        ),
-                                        k8s_client.V1Volume(
-                                            name="output-data",
-                                            persistent_volume_claim=k8s_client.V1PersistentVolumeClaimVolumeSource(
-                                                claim_name="orchestrator-pvc"
-                                            ),
-                                        ),
-                                    ],
-                                )
-                            )
+                        spec=k8s_client.V1CronJobSpec(
+                            schedule=schedule,
+                            # Forbid by default so that a slow run is never
+                            # overlapped by the next one
+                            concurrency_policy=spec.get("concurrencyPolicy", "Forbid"),
+                            starting_deadline_seconds=spec.get(
+                                "startingDeadlineSeconds"
+                            ),
+                            successful_jobs_history_limit=spec.get(
+                                "successfulJobsHistoryLimit", 3
+                            ),
+                            failed_jobs_history_limit=spec.get(
+                                "failedJobsHistoryLimit", 1
+                            ),
+                            job_template=k8s_client.V1JobTemplateSpec(
+                                metadata=k8s_client.V1ObjectMeta(
+                                    labels={SERVICE_LABEL: name}
+                                ),
+                                spec=build_job_spec(
+                                    name,
+                                    reps,
+                                    container_spec,
+                                    mount_files,
+                                    placement,
+                                    ttl_seconds_after_finished,
+                                ),
+                            ),
                         ),
                     ),
                 )
@@ -247,8 +671,46 @@ async def analytics_handler(
         return {"job_creation": True}
 
     elif job_type == "persistent":
-        apps_api = k8s_client.AppsV1Api()
-        apps_api.create_namespaced_deployment(
+        min_replicas = spec.get("minReplicas", 1)
+        max_replicas = spec.get("maxReplicas")
+
+        if port:
+            # Only route traffic (Service/Ingress) to replicas that accept connections
+            readiness_path = spec.get("readinessPath")
+            container_spec.readiness_probe = k8s_client.V1Probe(
+                http_get=(
+                    k8s_client.V1HTTPGetAction(path=readiness_path, port=port)
+                    if readiness_path
+                    else None
+                ),
+                tcp_socket=(
+                    None if readiness_path else k8s_client.V1TCPSocketAction(port=port)
+                ),
+                initial_delay_seconds=5,
+                period_seconds=10,
+            )
+
+        if max_replicas and uses_cpu_target(spec):
+            # Utilisation is relative to the CPU request, without which the
+            # autoscaler can't compute it
+            resources = container_spec.resources or k8s_client.V1ResourceRequirements()
+            if not (resources.requests or {}).get("cpu"):
+                logger.warning(
+                    f"{name} scales on CPU utilisation without a CPU request, "
+                    f"requesting {AUTOSCALER_DEFAULT_CPU_REQUEST}"
+                )
+                resources.requests = {
+                    **(resources.requests or {}),
+                    "cpu": AUTOSCALER_DEFAULT_CPU_REQUEST,
+                }
+                container_spec.resources = resources
+
+        apps_api = k8s_client.AppsV1Api(get_kubernetes_api())
+        create_if_missing(
+            apps_api.create_namespaced_deployment,
+            "Deployment",
+            name,
+            logger,
             namespace=namespace,
             body=k8s_client.V1Deployment(
                 api_version="apps/v1",
@@ -257,19 +719,41 @@ async def analytics_handler(
                     name=name, namespace=namespace, owner_references=[owner_reference]
                 ),
                 spec=k8s_client.V1DeploymentSpec(
+                    replicas=min_replicas,
+                    selector=k8s_client.V1LabelSelector(match_labels={"app": name}),
                     template=k8s_client.V1PodTemplateSpec(
-                        metadata=k8s_client.V1ObjectMeta(labels={"app": name}),
+                        metadata=k8s_client.V1ObjectMeta(
+                            labels={"app": name, SERVICE_LABEL: name}
+                        ),
                         spec=k8s_client.V1PodSpec(
                             containers=[container_spec],
+                            **placement,
                         ),
                     )
                 ),
             ),
         )
 
+        if max_replicas:
+            autoscaling_api = k8s_client.AutoscalingV2Api(get_kubernetes_api())
+            create_if_missing(
+                autoscaling_api.create_namespaced_horizontal_pod_autoscaler,
+                "HorizontalPodAutoscaler",
+                name,
+                logger,
+                namespace=namespace,
+                body=build_autoscaler(
+                    name, namespace, spec, min_replicas, max_replicas, owner_reference
+                ),
+            )
+
         if port:
-            core_api = k8s_client.CoreV1Api()
-            core_api.create_namespaced_service(
+            core_api = k8s_client.CoreV1Api(get_kubernetes_api())
+            create_if_missing(
+                core_api.create_namespaced_service,
+                "Service",
+                name,
+                logger,
                 namespace=namespace,
                 body=k8s_client.V1Service(
                     api_version="v1",
@@ -286,8 +770,12 @@ async def analytics_handler(
                 ),
             )
 
-            networking_api = k8s_client.NetworkingV1Api()
-            networking_api.create_namespaced_ingress(
+            networking_api = k8s_client.NetworkingV1Api(get_kubernetes_api())
+            create_if_missing(
+                networking_api.create_namespaced_ingress,
+                "Ingress",
+                name,
+                logger,
                 namespace=namespace,
                 body=k8s_client.V1Ingress(
                     api_version="networking.k8s.io/v1",
@@ -0,0 +1,74 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+KUBERNETES_REQUEST_DURATION = Histogram(
+    "orchestrator_operator_kubernetes_request_duration_seconds",
+    "Latency of Kubernetes API calls",
+    ["method", "path"],
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "orchestrator_operator_mongo_command_duration_seconds",
+    "Latency of MongoDB commands",
+    ["command", "outcome"],
+)
+CHECK_OUTPUT_DURATION = Histogram(
+    "orchestrator_operator_check_output_duration_seconds",
+    "Duration of a check_output timer tick",
+    ["job_type"],
+)
+CHECK_OUTPUT_FILES_UPLOADED = Histogram(
+    "orchestrator_operator_check_output_files_uploaded",
+    "Number of output files uploaded per check_output timer tick",
+    ["job_type"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+FILES_UPLOADED = Counter(
+    "orchestrator_operator_files_uploaded_total",
+    "Output files uploaded to the orchestrator API",
+    ["job_type"],
+)
+UPLOAD_BYTES = Counter(
+    "orchestrator_operator_upload_bytes_total",
+    "Bytes of output files uploaded to the orchestrator API",
+)
+EVENT_LOOP_LAG = Histogram(
+    "orchestrator_operator_event_loop_lag_seconds",
+    "Delay of the event loop in waking up a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+GC_DELETED = Counter(
+    "orchestrator_operator_gc_deleted_total",
+    "Objects deleted by the garbage collector",
+    ["kind"],
+)
+GC_RECLAIMED_BYTES = Counter(
+    "orchestrator_operator_gc_reclaimed_bytes_total",
+    "GridFS bytes reclaimed by the garbage collector",
+)
+GC_DURATION = Histogram(
+    "orchestrator_operator_gc_duration_seconds",
+    "Duration of a garbage collection sweep",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300),
+)
+STARTUP_DURATION = Gauge(
+    "orchestrator_operator_startup_duration_seconds",
+    "Time from the process start until the startup handler completed",
+)
+SHARD_MEMBERS = Gauge(
+    "orchestrator_operator_shard_members",
+    "Operator replicas sharing the Analytics resources",
+)
+LAUNCH_TO_FIRST_OUTPUT = Histogram(
+    "orchestrator_operator_launch_to_first_output_seconds",
+    "Time from the launch of an ondemand service until its first output file was collected",
+    ["image"],
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400),
+)
+PREPULLED_IMAGES = Gauge(
+    "orchestrator_operator_prepulled_images",
+    "Images kept pulled on every node by the pre-pull DaemonSet",
+)
+WARM_POOL_PODS = Gauge(
+    "orchestrator_operator_warm_pool_pods",
+    "Idle placeholder pods requested for the warm pool",
+)
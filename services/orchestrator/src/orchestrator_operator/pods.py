@@ -0,0 +1,68 @@
+"""Pod spec parts shared by the pods of services and the operator's own workloads"""
+
+from kubernetes import client as k8s_client
+
+from .conf import SERVICE_LABEL
+
+
+def image_name(image: str) -> str:
+    """Image reference without its tag or digest (`registry:port/repo:tag` and
+    `registry:port/repo@sha256:...` -> `registry:port/repo`)"""
+    image = image.partition("@")[0]
+    path, slash, last = image.rpartition("/")
+    return f"{path}{slash}{last.partition(':')[0]}"
+
+
+def build_resources(spec: dict) -> k8s_client.V1ResourceRequirements | None:
+    resources = spec.get("resources")
+    if not resources:
+        return None
+    return k8s_client.V1ResourceRequirements(
+        requests=resources.get("requests"),
+        limits=resources.get("limits"),
+    )
+
+
+def build_placement(name: str, spec: dict) -> dict:
+    """Node selector, tolerations and pod anti-affinity for the pods of a service.
+
+    Returned as keyword arguments for `V1PodSpec`."""
+    anti_affinity = spec.get("podAntiAffinity")
+    affinity = None
+    if anti_affinity:
+        # Spread the pods of a service (e.g. the reps of a DES run) across nodes
+        term = k8s_client.V1PodAffinityTerm(
+            label_selector=k8s_client.V1LabelSelector(match_labels={SERVICE_LABEL: name}),
+            topology_key="kubernetes.io/hostname",
+        )
+        affinity = k8s_client.V1Affinity(
+            pod_anti_affinity=(
+                k8s_client.V1PodAntiAffinity(
+                    required_during_scheduling_ignored_during_execution=[term]
+                )
+                if anti_affinity == "required"
+                else k8s_client.V1PodAntiAffinity(
+                    preferred_during_scheduling_ignored_during_execution=[
+                        k8s_client.V1WeightedPodAffinityTerm(
+                            weight=100, pod_affinity_term=term
+                        )
+                    ]
+                )
+            )
+        )
+
+    return dict(
+        node_selector=spec.get("nodeSelector"),
+        tolerations=[
+            k8s_client.V1Toleration(
+                key=toleration.get("key"),
+                operator=toleration.get("operator"),
+                value=toleration.get("value"),
+                effect=toleration.get("effect"),
+                toleration_seconds=toleration.get("tolerationSeconds"),
+            )
+            for toleration in spec.get("tolerations", [])
+        ]
+        or None,
+        affinity=affinity,
+    )
@@ -0,0 +1,217 @@
+"""Partitioning of the Analytics resources between operator replicas.
+
+Every replica holds a Lease (`coordination.k8s.io`) in the operator namespace and
+renews it every `SHARD_RENEW_INTERVAL_SECONDS`; the replicas whose lease has not
+expired are the members. Resources are assigned to members by consistent hashing of
+`namespace/name`, so a replica joining or leaving only moves the resources of its
+own share of the ring.
+
+Handlers and timers are filtered with `owned`, and a replica never records a
+resource it does not own as handled (`ShardedDiffBaseStorage`), so the creation of
+a resource is left to its owner. When the members change, each replica touches the
+resources whose owner changed, which makes kopf re-evaluate its filters: the new
+owner picks up the resource (including an unfinished creation) and the previous
+owner stops its timers."""
+
+import asyncio
+import bisect
+import datetime
+import hashlib
+import logging
+import time
+
+import kopf
+from kubernetes import client as k8s_client
+from kubernetes.client import ApiException
+
+from .conf import (
+    OPERATOR_NAMESPACE,
+    POD_NAME,
+    PROJECT_GROUP,
+    SHARD_LEASE_DURATION_SECONDS,
+    SHARD_RENEW_INTERVAL_SECONDS,
+    SHARD_VIRTUAL_NODES,
+    VERSION,
+)
+from .kube import get_kubernetes_api, list_analytics_resources
+from .metrics import SHARD_MEMBERS
+
+logger = logging.getLogger(__name__)
+
+SHARD_LABEL = f"{PROJECT_GROUP}/operator-shard"
+REBALANCED_ANNOTATION = f"{PROJECT_GROUP}/shard-rebalanced"
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, members: frozenset[str], virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        self.members = members
+        points = sorted(
+            (ring_hash(f"{member}#{i}"), member)
+            for member in members
+            for i in range(virtual_nodes)
+        )
+        self.hashes = [point for point, _ in points]
+        self.owners = [member for _, member in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self.owners:
+            return None
+        index = bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)
+        return self.owners[index]
+
+
+def resource_key(namespace: str, name: str) -> str:
+    return f"{namespace}/{name}"
+
+
+class Membership:
+    def __init__(self, identity: str = POD_NAME):
+        self.identity = identity
+        self.lease_name = f"orchestrator-operator-{identity}"
+        self.ring = HashRing(frozenset())
+        self.renewed_at = float("-inf")
+
+    def owns(self, key: str) -> bool:
+        # A replica that could not renew its lease may already have been replaced by
+        # the others, so it stops handling anything until it renews again
+        if time.monotonic() - self.renewed_at > SHARD_LEASE_DURATION_SECONDS:
+            return False
+        return self.ring.owner(key) == self.identity
+
+    def renew_lease(self):
+        api_instance = k8s_client.CoordinationV1Api(get_kubernetes_api())
+        renewed_at = time.monotonic()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        spec = {
+            "holderIdentity": self.identity,
+            "leaseDurationSeconds": SHARD_LEASE_DURATION_SECONDS,
+            "renewTime": now,
+        }
+        try:
+            api_instance.patch_namespaced_lease(
+                name=self.lease_name, namespace=OPERATOR_NAMESPACE, body={"spec": spec}
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            lease = k8s_client.V1Lease(
+                metadata=k8s_client.V1ObjectMeta(
+                    name=self.lease_name, labels={SHARD_LABEL: "member"}
+                ),
+                spec=k8s_client.V1LeaseSpec(
+                    holder_identity=self.identity,
+                    lease_duration_seconds=SHARD_LEASE_DURATION_SECONDS,
+                    acquire_time=now,
+                    renew_time=now,
+                ),
+            )
+            api_instance.create_namespaced_lease(namespace=OPERATOR_NAMESPACE, body=lease)
+        self.renewed_at = renewed_at
+
+    def live_members(self) -> frozenset[str]:
+        api_instance = k8s_client.CoordinationV1Api(get_kubernetes_api())
+        leases = api_instance.list_namespaced_lease(
+            namespace=OPERATOR_NAMESPACE, label_selector=f"{SHARD_LABEL}=member"
+        )
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return frozenset(
+            lease.spec.holder_identity
+            for lease in leases.items
+            if lease.spec.renew_time
+            and lease.spec.renew_time
+            + datetime.timedelta(seconds=lease.spec.lease_duration_seconds or 0)
+            > now
+        ) | {self.identity}
+
+    def release_lease(self):
+        api_instance = k8s_client.CoordinationV1Api(get_kubernetes_api())
+        try:
+            api_instance.delete_namespaced_lease(
+                name=self.lease_name, namespace=OPERATOR_NAMESPACE
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+
+    def heartbeat(self):
+        """Renew the lease and re-read the members, rebalancing if they changed"""
+        self.renew_lease()
+        members = self.live_members()
+        if members == self.ring.members:
+            return
+        previous = self.ring
+        self.ring = HashRing(members)
+        SHARD_MEMBERS.set(len(members))
+        logger.info(
+            f"Operator replicas changed: {sorted(previous.members)} -> {sorted(members)}"
+        )
+        if previous.members:
+            self.rebalance(previous)
+
+    def rebalance(self, previous: HashRing):
+        """Touch the resources whose owner changed, so that both the previous and the
+        new owner re-evaluate them"""
+        api_instance = k8s_client.CustomObjectsApi(get_kubernetes_api())
+        resources = list_analytics_resources()
+        ring_id = ring_hash(",".join(sorted(self.ring.members)))
+        owned = 0
+        for item in resources:
+            name, namespace = item["metadata"]["name"], item["metadata"]["namespace"]
+            key = resource_key(namespace, name)
+            owner, previous_owner = self.ring.owner(key), previous.owner(key)
+            owned += owner == self.identity
+            if owner == previous_owner or self.identity not in (owner, previous_owner):
+                continue
+            # The value differs between the replicas involved, so the second touch
+            # still produces an event for the replica that saw the change first
+            annotation = f"{self.identity}:{owner}:{ring_id:x}"
+            body = {"metadata": {"annotations": {REBALANCED_ANNOTATION: annotation}}}
+            try:
+                api_instance.patch_namespaced_custom_object(
+                    group=PROJECT_GROUP,
+                    version=VERSION,
+                    namespace=namespace,
+                    plural="analytics",
+                    name=name,
+                    body=body,
+                )
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+        logger.info(
+            f"Rebalanced: {owned} of {len(resources)} resources owned"
+        )
+
+
+membership = Membership()
+
+
+def owned(name: str, namespace: str, **_) -> bool:
+    """kopf filter: whether this replica handles the resource"""
+    return membership.owns(resource_key(namespace, name))
+
+
+class ShardedDiffBaseStorage(kopf.AnnotationsDiffBaseStorage):
+    """Only records resources owned by this replica as handled.
+
+    kopf marks a resource as handled even when all its handlers were filtered out;
+    a replica that does not own a new resource must not do so before its owner
+    created the workload."""
+
+    def store(self, *, body: kopf.Body, patch: kopf.Patch, essence: kopf.BodyEssence):
+        if owned(body.metadata.name, body.metadata.namespace):
+            super().store(body=body, patch=patch, essence=essence)
+
+
+async def maintain_membership():
+    while True:
+        await asyncio.sleep(SHARD_RENEW_INTERVAL_SECONDS)
+        try:
+            # Lease and resource calls are blocking, so they stay off the event loop
+            await asyncio.to_thread(membership.heartbeat)
+        except Exception:
+            logger.exception("Could not renew the operator lease")
@@ -0,0 +1,363 @@
+"""Warm starts of frequently launched images.
+
+The images launched most often (counted from the `created_at` of the service records
+within PREPULL_WINDOW_SECONDS) are kept pulled on every node by a DaemonSet with one
+idle container per image. The containers run a static busybox copied in by an init
+container, so images don't need a shell, and keep the images referenced, out of the
+kubelet's image garbage collection.
+
+Optionally, a warm pool of idle placeholder pods (a Deployment per image, with the
+requests and placement of the image's defaults) holds node capacity for the most
+launched images. They run at a lower priority than the service pods, which preempt
+them rather than waiting for a node to be added; the Deployment then recreates the
+placeholder wherever capacity is left (or is added).
+
+Every replica keeps track of the frequently launched images (names without tags),
+which are the only images the per-image metrics are labelled with."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from kubernetes import client as k8s_client
+from kubernetes.client import ApiException
+from motor.core import AgnosticCollection
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .conf import (
+    OPERATOR_NAMESPACE,
+    PAUSE_IMAGE,
+    PREPULL_HELPER_IMAGE,
+    PREPULL_IMAGE_PULL_SECRETS,
+    PREPULL_MAX_IMAGES,
+    PREPULL_MIN_LAUNCHES,
+    PREPULL_WINDOW_SECONDS,
+    PROJECT_GROUP,
+    WARM_POOL_CPU_REQUEST,
+    WARM_POOL_IMAGES,
+    WARM_POOL_MEMORY_REQUEST,
+    WARM_POOL_PRIORITY_CLASS,
+    WARM_POOL_SIZE,
+)
+from .database import get_mongo_client
+from .kube import get_kubernetes_api
+from .metrics import PREPULLED_IMAGES, WARM_POOL_PODS
+from .pods import build_placement, image_name
+from .sharding import membership
+
+logger = logging.getLogger(__name__)
+
+PREPULL_NAME = "orchestrator-image-prepull"
+WARM_POOL_LABEL = f"{PROJECT_GROUP}/warm-pool"
+IMAGE_ANNOTATION = f"{PROJECT_GROUP}/image"
+# Hash of the generated spec; objects are only replaced when it changes
+SPEC_HASH_ANNOTATION = f"{PROJECT_GROUP}/spec-hash"
+
+HELPER_MOUNT = k8s_client.V1VolumeMount(name="prepull-helper", mount_path="/prepull")
+IDLE_RESOURCES = k8s_client.V1ResourceRequirements(
+    requests={"cpu": "1m", "memory": "4Mi"}, limits={"cpu": "10m", "memory": "16Mi"}
+)
+
+# Names of the frequently launched images, as of the last warm start interval
+frequent_images: set[str] = set()
+
+
+def image_label(image: str | None) -> str:
+    """Metric label of an image: its name if launched frequently, else "other" (keeps
+    the number of series bounded)"""
+    return image if image in frequent_images else "other"
+
+
+async def hot_images(
+    services_collection: AgnosticCollection, since: float, limit: int
+) -> list[tuple[str, int]]:
+    """Images (`image:version`) launched at least PREPULL_MIN_LAUNCHES times since
+    `since` with their launch counts, most launched first"""
+    if limit <= 0:
+        return []
+    pipeline = [
+        {
+            "$match": {
+                "created_at": {"$gte": since},
+                "image": {"$type": "string"},
+                "version": {"$type": "string"},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"$concat": ["$image", ":", "$version"]},
+                "launches": {"$sum": 1},
+            }
+        },
+        {"$match": {"launches": {"$gte": PREPULL_MIN_LAUNCHES}}},
+        {"$sort": {"launches": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    return [
+        (doc["_id"], doc["launches"])
+        async for doc in services_collection.aggregate(pipeline)
+    ]
+
+
+def with_spec_hash(body):
+    """Annotate `body` with the hash of its serialized spec"""
+    serialized = get_kubernetes_api().sanitize_for_serialization(body.spec)
+    body.metadata.annotations = {
+        **(body.metadata.annotations or {}),
+        SPEC_HASH_ANNOTATION: hashlib.md5(
+            json.dumps(serialized, sort_keys=True).encode()
+        ).hexdigest(),
+    }
+    return body
+
+
+def spec_changed(existing, body) -> bool:
+    return (existing.metadata.annotations or {}).get(
+        SPEC_HASH_ANNOTATION
+    ) != body.metadata.annotations[SPEC_HASH_ANNOTATION]
+
+
+def build_prepull_daemonset(
+    images: list[str], tolerations: list[dict]
+) -> k8s_client.V1DaemonSet:
+    labels = {"app": PREPULL_NAME}
+    return with_spec_hash(
+        k8s_client.V1DaemonSet(
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=k8s_client.V1ObjectMeta(
+                name=PREPULL_NAME, namespace=OPERATOR_NAMESPACE, labels=labels
+            ),
+            spec=k8s_client.V1DaemonSetSpec(
+                selector=k8s_client.V1LabelSelector(match_labels=labels),
+                # The pods hold no workload, so all nodes can pull new images at once
+                update_strategy=k8s_client.V1DaemonSetUpdateStrategy(
+                    type="RollingUpdate",
+                    rolling_update=k8s_client.V1RollingUpdateDaemonSet(
+                        max_unavailable="100%"
+                    ),
+                ),
+                template=k8s_client.V1PodTemplateSpec(
+                    metadata=k8s_client.V1ObjectMeta(labels=labels),
+                    spec=k8s_client.V1PodSpec(
+                        init_containers=[
+                            k8s_client.V1Container(
+                                name="helper",
+                                image=PREPULL_HELPER_IMAGE,
+                                command=["cp", "/bin/busybox", "/prepull/busybox"],
+                                volume_mounts=[HELPER_MOUNT],
+                                resources=IDLE_RESOURCES,
+                            )
+                        ],
+                        # Containers rather than init containers: images are pulled in
+                        # parallel and one that can't be pulled doesn't hold up the rest
+                        containers=[
+                            k8s_client.V1Container(
+                                name=f"image-{index}",
+                                image=image,
+                                image_pull_policy="IfNotPresent",
+                                command=["/prepull/busybox", "sleep", "2147483647"],
+                                volume_mounts=[HELPER_MOUNT],
+                                resources=IDLE_RESOURCES,
+                            )
+                            for index, image in enumerate(images)
+                        ],
+                        termination_grace_period_seconds=0,
+                        # Private images are pulled with these or with the secrets of
+                        # the namespace's default service account
+                        image_pull_secrets=[
+                            k8s_client.V1LocalObjectReference(name=secret)
+                            for secret in PREPULL_IMAGE_PULL_SECRETS
+                        ]
+                        or None,
+                        volumes=[
+                            k8s_client.V1Volume(
+                                name="prepull-helper",
+                                empty_dir=k8s_client.V1EmptyDirVolumeSource(),
+                            )
+                        ],
+                        # Also reach the nodes dedicated to the images (by their taints)
+                        **build_placement(PREPULL_NAME, {"tolerations": tolerations}),
+                    ),
+                ),
+            ),
+        )
+    )
+
+
+def sync_prepull_daemonset(images: list[str], tolerations: list[dict]):
+    apps_api = k8s_client.AppsV1Api(get_kubernetes_api())
+    try:
+        existing = apps_api.read_namespaced_daemon_set(
+            name=PREPULL_NAME, namespace=OPERATOR_NAMESPACE
+        )
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        existing = None
+
+    if not images:
+        if existing is not None:
+            apps_api.delete_namespaced_daemon_set(
+                name=PREPULL_NAME, namespace=OPERATOR_NAMESPACE
+            )
+            logger.info("Deleted the image pre-pull DaemonSet (no frequently launched images)")
+        return
+
+    body = build_prepull_daemonset(images, tolerations)
+    if existing is None:
+        apps_api.create_namespaced_daemon_set(namespace=OPERATOR_NAMESPACE, body=body)
+        logger.info(f"Created the image pre-pull DaemonSet for {images}")
+    elif spec_changed(existing, body):
+        body.metadata.resource_version = existing.metadata.resource_version
+        apps_api.replace_namespaced_daemon_set(
+            name=PREPULL_NAME, namespace=OPERATOR_NAMESPACE, body=body
+        )
+        logger.info(f"Updated the image pre-pull DaemonSet to {images}")
+
+
+def warm_pool_name(image: str) -> str:
+    return f"warm-pool-{hashlib.md5(image.encode()).hexdigest()[:10]}"
+
+
+def build_warm_pool(image: str, image_defaults: dict | None) -> k8s_client.V1Deployment:
+    """Placeholder pods sized and placed like the pods of `image`"""
+    name = warm_pool_name(image)
+    labels = {WARM_POOL_LABEL: name}
+    image_defaults = image_defaults or {}
+    requests = (image_defaults.get("resources") or {}).get("requests") or {
+        "cpu": WARM_POOL_CPU_REQUEST,
+        "memory": WARM_POOL_MEMORY_REQUEST,
+    }
+    placement = build_placement(
+        name,
+        {
+            key: image_defaults[key]
+            for key in ("nodeSelector", "tolerations")
+            if image_defaults.get(key)
+        },
+    )
+    return with_spec_hash(
+        k8s_client.V1Deployment(
+            api_version="apps/v1",
+            kind="Deployment",
+            metadata=k8s_client.V1ObjectMeta(
+                name=name,
+                namespace=OPERATOR_NAMESPACE,
+                labels=labels,
+                annotations={IMAGE_ANNOTATION: image},
+            ),
+            spec=k8s_client.V1DeploymentSpec(
+                replicas=WARM_POOL_SIZE,
+                selector=k8s_client.V1LabelSelector(match_labels=labels),
+                template=k8s_client.V1PodTemplateSpec(
+                    metadata=k8s_client.V1ObjectMeta(labels=labels),
+                    spec=k8s_client.V1PodSpec(
+                        priority_class_name=WARM_POOL_PRIORITY_CLASS,
+                        # Gives way to a preempting service pod at once
+                        termination_grace_period_seconds=0,
+                        containers=[
+                            k8s_client.V1Container(
+                                name="placeholder",
+                                image=PAUSE_IMAGE,
+                                resources=k8s_client.V1ResourceRequirements(
+                                    requests=requests
+                                ),
+                            )
+                        ],
+                        **placement,
+                    ),
+                ),
+            ),
+        )
+    )
+
+
+def sync_warm_pool(images: list[str], image_defaults: dict[str, dict]):
+    apps_api = k8s_client.AppsV1Api(get_kubernetes_api())
+    existing = {
+        deployment.metadata.name: deployment
+        for deployment in apps_api.list_namespaced_deployment(
+            namespace=OPERATOR_NAMESPACE, label_selector=WARM_POOL_LABEL
+        ).items
+    }
+    desired = {
+        warm_pool_name(image): build_warm_pool(image, image_defaults.get(image_name(image)))
+        for image in images
+    }
+
+    for name in existing.keys() - desired.keys():
+        apps_api.delete_namespaced_deployment(name=name, namespace=OPERATOR_NAMESPACE)
+        logger.info(f"Deleted warm pool {name}")
+    for name, body in desired.items():
+        current = existing.get(name)
+        if current is None:
+            apps_api.create_namespaced_deployment(namespace=OPERATOR_NAMESPACE, body=body)
+            logger.info(
+                f"Created warm pool {name} for {body.metadata.annotations[IMAGE_ANNOTATION]}"
+            )
+        elif spec_changed(current, body):
+            body.metadata.resource_version = current.metadata.resource_version
+            apps_api.replace_namespaced_deployment(
+                name=name, namespace=OPERATOR_NAMESPACE, body=body
+            )
+            logger.info(f"Updated warm pool {name}")
+
+
+async def frequent_launches(client: AsyncIOMotorClient) -> list[tuple[str, int]]:
+    """Images to pre-pull or keep a warm pool for, with their launch counts"""
+    pool_images = WARM_POOL_IMAGES if WARM_POOL_SIZE > 0 else 0
+    return await hot_images(
+        client.orchestrator.services,
+        time.time() - PREPULL_WINDOW_SECONDS,
+        max(PREPULL_MAX_IMAGES, pool_images),
+    )
+
+
+async def maintain_warm_start() -> list[tuple[str, int]]:
+    """Bring the pre-pull DaemonSet and the warm pool in line with the launch counts.
+
+    Returns the frequently launched images with their launch counts."""
+    client = get_mongo_client()
+    pool_images = WARM_POOL_IMAGES if WARM_POOL_SIZE > 0 else 0
+    launches = await frequent_launches(client)
+    images = [image for image, _ in launches]
+    image_defaults = {
+        doc["_id"]: doc
+        async for doc in client.orchestrator.image_defaults.find(
+            {"_id": {"$in": list({image_name(image) for image in images})}}
+        )
+    }
+
+    prepull = images[:PREPULL_MAX_IMAGES]
+    tolerations = []
+    for image in prepull:
+        defaults = image_defaults.get(image_name(image)) or {}
+        for toleration in defaults.get("tolerations") or []:
+            if toleration not in tolerations:
+                tolerations.append(toleration)
+    # Sorted so that a change in the ranking alone doesn't roll the DaemonSet
+    sync_prepull_daemonset(sorted(prepull), tolerations)
+    PREPULLED_IMAGES.set(len(prepull))
+
+    pool = images[:pool_images]
+    sync_warm_pool(pool, image_defaults)
+    WARM_POOL_PODS.set(len(pool) * WARM_POOL_SIZE)
+    return launches
+
+
+async def run_warm_start(interval: float):
+    while True:
+        try:
+            # A single replica manages them (whichever owns this key of the ring)
+            if membership.owns("warm-start"):
+                launches = await maintain_warm_start()
+            else:
+                launches = await frequent_launches(get_mongo_client())
+            frequent_images.clear()
+            frequent_images.update(image_name(image) for image, _ in launches)
+        except Exception:
+            logger.exception("Warm start maintenance failed")
+        await asyncio.sleep(interval)
@@ -1,8 +1,81 @@
 import logging
-from .conf import HOST, PORT
-from .main import app
+import math
+import os
+import tempfile
+
+from .conf import (
+    EVENT_LOOP,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    HOST,
+    HTTP_PARSER,
+    PORT,
+    WORKERS,
+)
+
+
+def worker_count() -> int:
+    if WORKERS != "auto":
+        return int(WORKERS)
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    # The container's CPU limit (cgroup v2), rounded up
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def prepare_multiprocess_metrics():
+    """Workers write their metrics to files in PROMETHEUS_MULTIPROC_DIR, which any
+    worker aggregates on /metrics. Must be set before the workers import
+    prometheus_client."""
+    directory = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="orchestrator-api-metrics-")
+    )
+    os.makedirs(directory, exist_ok=True)
+    # Files left by a previous run would be added to this run's counts
+    for name in os.listdir(directory):
+        if name.endswith(".db"):
+            os.remove(os.path.join(directory, name))
+
 
 if __name__ == "__main__":
     import uvicorn
-    logging.basicConfig(level=logging.INFO)
-    uvicorn.run(app=app, host=HOST, port=PORT)
+    from uvicorn.config import LOGGING_CONFIG
+
+    workers = worker_count()
+    if workers > 1:
+        prepare_multiprocess_metrics()
+    # Configured in every worker (a dictConfig rather than basicConfig, which would
+    # only apply to this process)
+    log_config = {
+        **LOGGING_CONFIG,
+        "formatters": {
+            **LOGGING_CONFIG["formatters"],
+            "basic": {"format": logging.BASIC_FORMAT},
+        },
+        "handlers": {
+            **LOGGING_CONFIG["handlers"],
+            "basic": {"formatter": "basic", "class": "logging.StreamHandler"},
+        },
+        "root": {"handlers": ["basic"], "level": "INFO"},
+    }
+    # Imported by each worker (by name, as the package is `app` in the image)
+    uvicorn.run(
+        app=f"{__package__}.main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=EVENT_LOOP,
+        http=HTTP_PARSER,
+        # On SIGTERM the server stops accepting connections and waits this long for
+        # in-flight requests, including streaming downloads, to complete
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        log_config=log_config,
+    )
@@ -0,0 +1,104 @@
+"""Compression at rest for GridFS files.
+
+The codec a file was stored with is recorded as `metadata.encoding` (an HTTP
+content-coding name), so that downloads can pass the stored bytes through to clients
+that accept it and decompress on the fly for the others."""
+
+import gzip
+import mimetypes
+import tempfile
+import zlib
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+from .conf import COMPRESSION_CODEC, COMPRESSION_MIN_SIZE
+
+CHUNK_SIZE = 256 * 1024
+
+# Formats that are already compressed (zip based office documents, images, archives)
+# gain nothing from a second pass
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/yaml",
+    "application/x-yaml",
+    "application/vnd.ms-excel",
+}
+
+
+def is_compressible(content_type: str | None) -> bool:
+    return bool(content_type) and (
+        content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+    )
+
+
+def choose_encoding(content_type: str | None, filename: str | None, size: int) -> str | None:
+    """Content-coding to store a file with, if any"""
+    if COMPRESSION_CODEC == "none" or size < COMPRESSION_MIN_SIZE:
+        return None
+    if not content_type or content_type == "application/octet-stream":
+        content_type = mimetypes.guess_type(filename or "")[0]
+    if not is_compressible(content_type):
+        return None
+    if COMPRESSION_CODEC == "zstd" and zstandard is not None:
+        return "zstd"
+    return "gzip"
+
+
+def compress_file(src: BinaryIO, encoding: str) -> BinaryIO:
+    """Compress `src` (from its start) into a spooled temporary file, rewound"""
+    dst = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    src.seek(0)
+    if encoding == "zstd":
+        with zstandard.ZstdCompressor().stream_writer(dst, closefd=False) as writer:
+            while chunk := src.read(CHUNK_SIZE):
+                writer.write(chunk)
+    else:
+        with gzip.GzipFile(fileobj=dst, mode="wb", mtime=0) as writer:
+            while chunk := src.read(CHUNK_SIZE):
+                writer.write(chunk)
+    src.seek(0)
+    dst.seek(0)
+    return dst
+
+
+def decompressor(encoding: str):
+    """Incremental decompressor with `decompress(chunk)` and `flush()`"""
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to decompress zstd files")
+        return zstandard.ZstdDecompressor().decompressobj()
+    # wbits=31: gzip container
+    return zlib.decompressobj(wbits=31)
+
+
+def decompress(data: bytes, encoding: str | None) -> bytes:
+    if not encoding:
+        return data
+    obj = decompressor(encoding)
+    return obj.decompress(data) + obj.flush()
+
+
+def accepts_encoding(accept_encoding: str | None, encoding: str) -> bool:
+    """Whether an `Accept-Encoding` header allows the given content-coding
+
+    A coding named explicitly takes precedence over `*`, wherever either appears in
+    the header (RFC 9110 section 12.5.3)."""
+    qvalues = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.strip().lower()] = q
+    return qvalues.get(encoding, qvalues.get("*", 0.0)) > 0
@@ -3,6 +3,7 @@ import os
 env_get = os.environ.get
 
 VERSION = env_get("VERSION", "v1alpha1")
+SERVICE_LABEL = "eng.cam.ac.uk/service"
 HOST = env_get("HOST", "0.0.0.0")
 PORT = int(env_get("PORT", "8000"))
 MONGO_HOST = env_get("MONGO_HOST", "localhost")
@@ -10,3 +11,44 @@ MONGO_PORT = int(env_get("MONGO_PORT", "27017"))
 MONGO_USER = env_get("MONGO_USER", "root")
 MONGO_PASSWORD = env_get("MONGO_PASSWORD", "password")
 MONGO_TIMEOUT_MS = int(env_get("MONGO_TIMEOUT_MS", "5000"))
+# Codec used to store compressible uploads (gzip, zstd if zstandard is installed, or none)
+COMPRESSION_CODEC = env_get("COMPRESSION_CODEC", "gzip")
+COMPRESSION_MIN_SIZE = int(env_get("COMPRESSION_MIN_SIZE", "1024"))
+# Where new uploads are stored (gridfs, filesystem or s3); existing files are read
+# from the backend recorded with them
+STORAGE_BACKEND = env_get("STORAGE_BACKEND", "gridfs")
+STORAGE_CHUNK_SIZE = int(env_get("STORAGE_CHUNK_SIZE", str(255 * 1024)))
+FILESYSTEM_STORAGE_ROOT = env_get("FILESYSTEM_STORAGE_ROOT", "/data/files")
+S3_ENDPOINT_URL = env_get("S3_ENDPOINT_URL")
+S3_REGION = env_get("S3_REGION")
+S3_BUCKET = env_get("S3_BUCKET", "orchestrator-files")
+S3_ACCESS_KEY_ID = env_get("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = env_get("S3_SECRET_ACCESS_KEY")
+# Namespaces services can be launched in (comma-separated); the first one is the default
+ALLOWED_NAMESPACES = [
+    namespace.strip()
+    for namespace in env_get("ALLOWED_NAMESPACES", "default").split(",")
+    if namespace.strip()
+]
+DEFAULT_NAMESPACE = env_get("DEFAULT_NAMESPACE", ALLOWED_NAMESPACES[0])
+# Server processes: a number, or "auto" for the CPUs available to the container
+WORKERS = env_get("WORKERS", "1")
+# uvloop and httptools when they are installed ("auto"), else asyncio and h11
+EVENT_LOOP = env_get("EVENT_LOOP", "auto")
+HTTP_PARSER = env_get("HTTP_PARSER", "auto")
+# Time in-flight requests (e.g. streaming downloads) get to finish on shutdown
+GRACEFUL_SHUTDOWN_TIMEOUT = int(env_get("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+# Sensor time series (written by Telegraf), served downsampled by the /timeseries routes
+INFLUXDB_URL = env_get("INFLUXDB_URL", "http://influxdb.default.svc.cluster.local:8086")
+INFLUXDB_TOKEN = env_get("INFLUXDB_TOKEN", "")
+INFLUXDB_ORG = env_get("INFLUXDB_ORG", "camdt")
+INFLUXDB_BUCKET = env_get("INFLUXDB_BUCKET", "default")
+INFLUXDB_TIMEOUT = float(env_get("INFLUXDB_TIMEOUT", "30"))
+# Windows (per machine) a single query may return
+TIMESERIES_MAX_WINDOWS = int(env_get("TIMESERIES_MAX_WINDOWS", "100000"))
+# Rows per chunk (CSV) or record batch (Arrow) of streamed responses
+TIMESERIES_CHUNK_ROWS = int(env_get("TIMESERIES_CHUNK_ROWS", "5000"))
+# Results of up to TIMESERIES_CACHE_MAX_ROWS rows are kept this long (0 disables the cache)
+TIMESERIES_CACHE_TTL = float(env_get("TIMESERIES_CACHE_TTL", "30"))
+TIMESERIES_CACHE_MAX_ROWS = int(env_get("TIMESERIES_CACHE_MAX_ROWS", "50000"))
+TIMESERIES_CACHE_ENTRIES = int(env_get("TIMESERIES_CACHE_ENTRIES", "256"))
@@ -1,29 +1,79 @@
-from contextlib import asynccontextmanager
-from typing import AsyncIterator
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import TYPE_CHECKING
 
 from fastapi import Depends, FastAPI
-from kubernetes import client as k8s_client
-from kubernetes import config as k8s_config
 from motor.core import Database
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from motor.motor_asyncio import AsyncIOMotorClient
+from orchestrator_common.metrics import (
+    MongoCommandMetrics,
+    monitor_event_loop_lag,
+    process_start_time,
+)
 
 from .conf import MONGO_HOST, MONGO_PASSWORD, MONGO_PORT, MONGO_TIMEOUT_MS, MONGO_USER
+from .metrics import EVENT_LOOP_LAG, MONGO_COMMAND_DURATION, STARTUP_DURATION
+from .storage import Storage
+from .timeseries import Timeseries
 
-client = AsyncIOMotorClient(
-    host=MONGO_HOST,
-    port=MONGO_PORT,
-    username=MONGO_USER,
-    password=MONGO_PASSWORD,
-    timeoutMS=MONGO_TIMEOUT_MS,
-)
+if TYPE_CHECKING:
+    from kubernetes.client import ApiClient
+
+client: AsyncIOMotorClient | None = None
+kubernetes_api: asyncio.Future[ApiClient] | None = None
+storage: Storage | None = None
+timeseries: Timeseries | None = None
+
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        host=MONGO_HOST,
+        port=MONGO_PORT,
+        username=MONGO_USER,
+        password=MONGO_PASSWORD,
+        timeoutMS=MONGO_TIMEOUT_MS,
+        event_listeners=[MongoCommandMetrics(MONGO_COMMAND_DURATION)],
+    )
+
+
+def create_kubernetes_api() -> ApiClient:
+    from kubernetes import config as k8s_config
+
+    from .kube import create_api_client
+
+    k8s_config.load_config()
+    return create_api_client()
 
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
+    global client, kubernetes_api, storage, timeseries
+    # Created here rather than at import, in the event loop that serves the app (one
+    # set per worker process)
+    client = create_mongo_client()
+    timeseries = Timeseries()
+    event_loop_lag_task = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG))
+    # The Kubernetes client is imported and created in the background once the app
+    # is serving, so that the startup doesn't wait for it. Requests share it (and
+    # its connection pool).
+    kubernetes_api = asyncio.get_running_loop().run_in_executor(
+        None, create_kubernetes_api
+    )
+    STARTUP_DURATION.labels(phase="ready").set(time.time() - process_start_time())
     try:
         yield
     finally:
+        event_loop_lag_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await event_loop_lag_task
         client.close()
+        with suppress(Exception):
+            (await kubernetes_api).close()
+        await timeseries.close()
+        client, kubernetes_api, storage, timeseries = None, None, None, None
 
 
 async def get_mongo_client() -> AsyncIOMotorClient:
@@ -45,17 +95,30 @@ async def get_orchestrator_files_database(
     return client.orchestrator_files
 
 
-async def get_gridfs_orchestrator_files(
+async def get_storage(
     database: Database = Depends(get_orchestrator_files_database),
-) -> AsyncIOMotorGridFSBucket:
-    """Dependency for GridFS instance (orchestrator_files database)"""
-    return AsyncIOMotorGridFSBucket(database)
+) -> Storage:
+    """Dependency for blob storage (orchestrator_files database and backends)"""
+    global storage
+    if storage is None:
+        storage = Storage(database)
+    return storage
 
 
-async def get_kubernetes_api() -> AsyncIterator[k8s_client.ApiClient]:
-    k8s_config.load_config()
-    k8s_api = k8s_client.ApiClient()
-    try:
-        yield k8s_api
-    finally:
-        k8s_api.close()
+async def get_timeseries() -> Timeseries:
+    """Dependency for downsampled InfluxDB queries (client and cache of the worker)"""
+    return timeseries
+
+
+async def get_kubernetes_api() -> ApiClient:
+    """Dependency for the Kubernetes API client"""
+    global kubernetes_api
+    if kubernetes_api.done() and (
+        kubernetes_api.cancelled() or kubernetes_api.exception()
+    ):
+        # e.g. the configuration couldn't be loaded, or the creation was cancelled;
+        # retried for every request until it succeeds
+        kubernetes_api = asyncio.get_running_loop().run_in_executor(
+            None, create_kubernetes_api
+        )
+    return await kubernetes_api
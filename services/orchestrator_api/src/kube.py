@@ -0,0 +1,13 @@
+"""Kubernetes client of the API.
+
+`kubernetes.client` imports thousands of generated model classes, so this module is
+only imported when the client is created, in the background once the app is serving
+(see `deps.create_kubernetes_api`)."""
+
+from orchestrator_common.kube import InstrumentedApiClient
+
+from .metrics import KUBERNETES_REQUEST_DURATION
+
+
+def create_api_client() -> InstrumentedApiClient:
+    return InstrumentedApiClient(KUBERNETES_REQUEST_DURATION)
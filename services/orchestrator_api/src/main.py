@@ -1,10 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from .conf import VERSION
 from .deps import app_lifespan, get_mongo_client
+from .metrics import PrometheusMiddleware, metrics_registry
 from .routes.dt_service import router as dtservice_router
 from .routes.files import router as files_router
+from .routes.timeseries import router as timeseries_router
 
 app = FastAPI(
     title="Orchestrator API",
@@ -28,6 +31,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
 
 
 @app.get("/healthz")
@@ -35,5 +39,13 @@ async def healthz():
     return {'status': 'ok'}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(
+        content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST
+    )
+
+
 app.include_router(dtservice_router)
 app.include_router(files_router)
+app.include_router(timeseries_router)
@@ -0,0 +1,138 @@
+import os
+import re
+import time
+
+from orchestrator_common.metrics import process_start_time
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    "orchestrator_api_request_duration_seconds",
+    "Latency of HTTP requests, including streaming the response body",
+    ["method", "route", "status"],
+)
+KUBERNETES_REQUEST_DURATION = Histogram(
+    "orchestrator_api_kubernetes_request_duration_seconds",
+    "Latency of Kubernetes API calls",
+    ["method", "path"],
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "orchestrator_api_mongo_command_duration_seconds",
+    "Latency of MongoDB commands",
+    ["command", "outcome"],
+)
+GRIDFS_BYTES = Counter(
+    "orchestrator_api_gridfs_bytes_total",
+    "Bytes written to (in) and read from (out) GridFS",
+    ["direction"],
+)
+STORAGE_BYTES = Counter(
+    "orchestrator_api_storage_bytes_total",
+    "Bytes written to (in) and read from (out) blob storage",
+    ["backend", "direction"],
+)
+UPLOADS = Counter(
+    "orchestrator_api_uploads_total",
+    "Files received by the upload endpoint",
+)
+UPLOAD_DEDUP_HITS = Counter(
+    "orchestrator_api_upload_dedup_hits_total",
+    "Uploads answered with an existing file of the same hash",
+)
+TIMESERIES_QUERIES = Counter(
+    "orchestrator_api_timeseries_queries_total",
+    "Time series queries, by whether they were answered from the cache (hit) or InfluxDB (miss)",
+    ["cache"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "orchestrator_api_event_loop_lag_seconds",
+    "Delay of the event loop in waking up a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+STARTUP_DURATION = Gauge(
+    "orchestrator_api_startup_duration_seconds",
+    "Time from the process start until the app was ready (ready) and served its first request (first_request)",
+    ["phase"],
+    # Of the slowest live worker when running several
+    multiprocess_mode="livemax",
+)
+
+# Files of the gauges of a worker that only count while it is alive
+LIVE_GAUGE_FILE = re.compile(r"gauge_live[a-z]+_(\d+)\.db")
+
+
+def mark_dead_workers(directory: str):
+    """Drop the live gauges of workers that have exited, which uvicorn doesn't report
+    when it replaces a worker (e.g. one that crashed)"""
+    pids = {
+        int(match.group(1))
+        for name in os.listdir(directory)
+        if (match := LIVE_GAUGE_FILE.fullmatch(name))
+    }
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, directory)
+        except PermissionError:
+            # Alive, as another user
+            pass
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Metrics of this process, or of all workers when they share a
+    PROMETHEUS_MULTIPROC_DIR (see `__main__`)"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    mark_dead_workers(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording the latency of every request by route template.
+
+    Implemented as a plain ASGI middleware (rather than `BaseHTTPMiddleware`) so that
+    the time spent streaming file downloads is included."""
+
+    def __init__(self, app):
+        self.app = app
+        self.served_first_request = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; use its path template
+            # so that ids don't end up as label values
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=route.path if route else "unmatched",
+                status=status_code,
+            ).observe(time.perf_counter() - start)
+            if not self.served_first_request:
+                self.served_first_request = True
+                STARTUP_DURATION.labels(phase="first_request").set(
+                    time.time() - process_start_time()
+                )
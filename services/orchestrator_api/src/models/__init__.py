@@ -1,5 +1,6 @@
+import datetime
 import enum
-from typing import Any, Optional, Self, Union
+from typing import Annotated, Any, Optional, Self, Union
 
 import pydantic as pyd
 
@@ -19,6 +20,61 @@ class JobType(enum.StrEnum):
     SCHEDULED = "scheduled"
 
 
+class ConcurrencyPolicy(enum.StrEnum):
+    ALLOW = "Allow"
+    FORBID = "Forbid"
+    REPLACE = "Replace"
+
+
+class PodAntiAffinity(enum.StrEnum):
+    PREFERRED = "preferred"
+    REQUIRED = "required"
+
+
+# Kubernetes quantity such as "500m", "1Gi" or 2 (numbers are passed on as strings)
+Quantity = Annotated[Union[str, int, float], pyd.AfterValidator(str)]
+
+
+class ResourceRequirements(pyd.BaseModel):
+    """CPU/memory requests and limits of the service container"""
+
+    requests: Optional[dict[str, Quantity]] = pyd.Field(
+        default=None,
+        examples=[
+            {
+                "cpu": "500m",
+                "memory": "512Mi",
+            }
+        ],
+    )
+    """Minimum resources reserved for the container"""
+
+    limits: Optional[dict[str, Quantity]] = pyd.Field(
+        default=None,
+        examples=[
+            {
+                "cpu": "1",
+                "memory": "1Gi",
+            }
+        ],
+    )
+    """Maximum resources the container is allowed to use"""
+
+
+class Toleration(pyd.BaseModel):
+    """Kubernetes taint toleration"""
+
+    key: Optional[str] = None
+    operator: Optional[str] = pyd.Field(default=None, pattern=r"^(Exists|Equal)$")
+    value: Optional[str] = None
+    effect: Optional[str] = pyd.Field(
+        default=None, pattern=r"^(NoSchedule|PreferNoSchedule|NoExecute)$"
+    )
+    toleration_seconds: Optional[int] = pyd.Field(
+        default=None, serialization_alias="tolerationSeconds"
+    )
+
+
 class SimulationConfig(pyd.BaseModel):
     """Config for the simulation module type"""
 
@@ -54,12 +110,104 @@ class AnalyticsConfig(pyd.BaseModel):
     )
     """Cron schedule expression"""
 
+    concurrency_policy: Optional[ConcurrencyPolicy] = pyd.Field(
+        default=None,
+        examples=[
+            "Forbid",
+        ],
+    )
+    """
+    How concurrent runs of a scheduled job are treated (default: Forbid):
+      Allow => runs may overlap.
+      Forbid => a run is skipped while the previous one is still active.
+      Replace => the active run is replaced by the new one.
+    """
+
+    starting_deadline_seconds: Optional[int] = pyd.Field(
+        default=None,
+        ge=0,
+        examples=[
+            300,
+        ],
+    )
+    """Deadline in seconds for starting a scheduled run that missed its time"""
+
+    successful_jobs_history_limit: Optional[int] = pyd.Field(
+        default=None,
+        ge=0,
+        examples=[
+            3,
+        ],
+    )
+    """Number of successful scheduled runs to keep"""
+
+    failed_jobs_history_limit: Optional[int] = pyd.Field(
+        default=None,
+        ge=0,
+        examples=[
+            1,
+        ],
+    )
+    """Number of failed scheduled runs to keep"""
+
+    min_replicas: Optional[int] = pyd.Field(
+        default=None,
+        ge=1,
+        examples=[
+            1,
+        ],
+    )
+    """Minimum number of replicas of a persistent job (default: 1)"""
+
+    max_replicas: Optional[int] = pyd.Field(
+        default=None,
+        ge=1,
+        examples=[
+            4,
+        ],
+    )
+    """Maximum number of replicas of a persistent job (enables autoscaling)"""
+
+    target_cpu_utilization: Optional[int] = pyd.Field(
+        default=None,
+        ge=1,
+        le=100,
+        examples=[
+            70,
+        ],
+    )
+    """Average CPU utilisation (%) targeted by the autoscaler"""
+
+    target_requests_per_second: Optional[int] = pyd.Field(
+        default=None,
+        ge=1,
+        examples=[
+            50,
+        ],
+    )
+    """Average requests per second per replica targeted by the autoscaler"""
+
+    readiness_path: Optional[str] = pyd.Field(
+        default=None,
+        examples=[
+            "/healthz",
+        ],
+    )
+    """HTTP path probed for readiness of a persistent job (defaults to a TCP check of the port)"""
+
     @pyd.model_validator(mode="after")
     def check_model_validity(self) -> Self:
         if self.job_type == JobType.SCHEDULED:
             assert (
                 self.schedule is not None
             ), "Schedule must be provided for scheduled jobs"
+        if self.max_replicas is not None:
+            assert (
+                self.job_type == JobType.PERSISTENT
+            ), "Autoscaling is only supported for persistent jobs"
+            assert (
+                self.min_replicas or 1
+            ) <= self.max_replicas, "min_replicas must not exceed max_replicas"
         return self
 
 
@@ -85,6 +233,18 @@ class ServiceLaunchRequest(pyd.BaseModel):
     )
     """Description of what the service does"""
 
+    namespace: Optional[str] = pyd.Field(
+        default=None,
+        max_length=63,
+        pattern=r"^[a-z0-9]([-a-z0-9]*[a-z0-9])?$",
+        examples=["default"],
+    )
+    """
+    Kubernetes namespace to run the service in (one of the API's allowed namespaces)
+
+    Defaults to the API's default namespace.
+    """
+
     port: Optional[int] = pyd.Field(
         default=None,
         ge=1024,
@@ -118,6 +278,42 @@ class ServiceLaunchRequest(pyd.BaseModel):
     )
     """A map of ids to the input files stored in the database and the path to mount"""
 
+    resources: Optional[ResourceRequirements] = pyd.Field(
+        default=None,
+    )
+    """
+    CPU/memory requests and limits of the service container
+
+    Falls back to the defaults stored for the image (if any) when not provided.
+    """
+
+    node_selector: Optional[dict[str, str]] = pyd.Field(
+        default=None,
+        examples=[
+            {
+                "kubernetes.io/arch": "amd64",
+            }
+        ],
+    )
+    """Node labels the service pods must be scheduled on"""
+
+    tolerations: Optional[list[Toleration]] = pyd.Field(
+        default=None,
+    )
+    """Taints tolerated by the service pods"""
+
+    pod_anti_affinity: Optional[PodAntiAffinity] = pyd.Field(
+        default=None,
+        examples=[
+            "preferred",
+        ],
+    )
+    """
+    Spread the pods of the service across nodes:
+      preferred => best effort.
+      required => pods that can't be placed on their own node remain pending.
+    """
+
     ana: Union[AnalyticsConfig, None] = pyd.Field(
         title="Config for the analytics module type",
         default=None,
@@ -152,3 +348,90 @@ class ServiceLaunchRequest(pyd.BaseModel):
 
 class ServiceLaunchResponse(pyd.BaseModel):
     id: str
+
+
+class ServiceState(enum.StrEnum):
+    OK = "ok"
+    RUNNING = "running"
+    SCHEDULED = "scheduled"
+    PENDING = "pending"
+    ERROR = "error"
+
+
+class ServiceRuns(pyd.BaseModel):
+    """Run counts of a DT service, from its kubernetes Jobs (for persistent services,
+    replica counts of its Deployment: ready replicas are active runs, unavailable
+    ones failed runs and all replicas the total)"""
+
+    active_runs: int
+    succeeded_runs: int
+    failed_runs: int
+    total_runs: int
+    status: ServiceState
+    """
+    Overall status of the service:
+      ok => all runs succeeded.
+      running => at least one run is active.
+      scheduled => a scheduled job that hasn't run yet.
+      pending => a persistent service without ready replicas yet.
+      error => a run failed (or no run was found), or a persistent service's
+        Deployment is missing or failed to progress.
+    """
+
+
+class ServiceSummary(ServiceRuns):
+    """A DT service as listed by the service endpoint"""
+
+    id: str
+    namespace: str
+    image: Optional[str] = None
+    version: Optional[str] = None
+    description: Optional[str] = None
+    reps: Optional[int] = None
+    mount_files: Optional[dict[str, str]] = None
+    """A map of ids to the input files mounted into the service"""
+
+    output_files: Optional[dict[str, str]] = None
+    """A map of ids to the output files collected from the service"""
+
+    created_at: Optional[float] = None
+    """Launch time (seconds since the epoch)"""
+
+
+class ServiceStatusResponse(ServiceRuns):
+    namespace: str
+    output_files: list[str]
+    """Ids of the output files collected from the service"""
+
+    run_outputs: dict[str, list[str]]
+    """Ids of the output files by the Job (run) that produced them"""
+
+
+class FileInfo(pyd.BaseModel):
+    file_id: str
+    filename: str
+    length: int
+    """Size of the uploaded content in bytes (before any compression on storage)"""
+
+    uploadDate: datetime.datetime
+    metadata: Optional[dict[str, Any]] = None
+
+
+class TimeseriesFormat(enum.StrEnum):
+    JSON = "json"
+    CSV = "csv"
+    ARROW = "arrow"
+
+
+class TimeseriesPoint(pyd.BaseModel):
+    """Aggregates of the readings of a machine over a window"""
+
+    time: datetime.datetime
+    """Start of the window"""
+
+    machine: Optional[str] = None
+    mean: float
+    min: float
+    max: float
+    count: int
+    """Number of readings in the window"""
@@ -1,86 +1,237 @@
+from __future__ import annotations
+
 import json
-import tempfile
 import time
 import logging
-from typing import Dict, List
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, Query, responses
-from kubernetes import client as k8s_client
-from kubernetes.client import ApiException
 from motor.core import AgnosticDatabase
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 
-from ..deps import get_gridfs_orchestrator_files, get_kubernetes_api, get_orchestrator_database
-from ..models import ServiceLaunchRequest, ServiceLaunchResponse
+from ..compression import decompress
+from ..conf import ALLOWED_NAMESPACES, DEFAULT_NAMESPACE, SERVICE_LABEL
+from ..deps import get_kubernetes_api, get_orchestrator_database, get_storage
+from ..lazy import LazyModule
+from ..models import (
+    JobType,
+    ServiceLaunchRequest,
+    ServiceLaunchResponse,
+    ServiceRuns,
+    ServiceState,
+    ServiceStatusResponse,
+    ServiceSummary,
+)
+from ..storage import Storage
+
+if TYPE_CHECKING:
+    from kubernetes import client as k8s_client
+    from kubernetes.client import ApiClient
+else:
+    # Imported on first use, to keep it out of the startup (parameters are annotated
+    # with `ApiClient`, which FastAPI leaves unresolved, for the same reason)
+    k8s_client = LazyModule("kubernetes.client")
 
 router = APIRouter(prefix="/service", tags=["core"])
 logger = logging.getLogger(__name__)
 
+# Fields read by `get_service_status` (besides those of the response)
+STATUS_FIELDS = {"namespace": 1, "job_type": 1, "job_status": 1}
+SUMMARY_PROJECTION = {
+    **STATUS_FIELDS,
+    **{
+        field: 1
+        for field in (
+            "image",
+            "version",
+            "description",
+            "reps",
+            "mount_files",
+            "output_files",
+            "created_at",
+        )
+    },
+}
+STATUS_PROJECTION = {**STATUS_FIELDS, "output_files": 1, "run_outputs": 1}
+
+
+def check_namespace(namespace: str):
+    if namespace not in ALLOWED_NAMESPACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Namespace {namespace} is not one of {', '.join(ALLOWED_NAMESPACES)}",
+        )
+
+
+def service_namespace(service: dict) -> str:
+    # Services launched before records had a namespace all ran in "default"
+    return service.get("namespace") or "default"
+
+
+def read_service_jobs(
+    service: dict, api_instance: k8s_client.BatchV1Api
+) -> list[k8s_client.V1Job]:
+    namespace = service_namespace(service)
+    service_id = str(service.get("_id"))
+    if service.get("job_type") == JobType.SCHEDULED:
+        # Every run of the CronJob spawns its own Job carrying the service label
+        return api_instance.list_namespaced_job(
+            namespace=namespace,
+            label_selector=f"{SERVICE_LABEL}={service_id}",
+        ).items
+    try:
+        return [
+            api_instance.read_namespaced_job(
+                namespace=namespace,
+                name=service_id,
+            )
+        ]
+    except k8s_client.ApiException as e:
+        if e.status != 404 or not service.get("job_status"):
+            raise
+        # Deleted after ttlSecondsAfterFinished; the operator recorded its final counts
+        return [k8s_client.V1Job(status=k8s_client.V1JobStatus(**service["job_status"]))]
+
+
+def deployment_runs(service: dict, k8s_api_client: k8s_client.ApiClient) -> ServiceRuns:
+    """Replica counts of a persistent service, from its Deployment (it has no Jobs)"""
+    api_instance = k8s_client.AppsV1Api(k8s_api_client)
+    try:
+        deployment = api_instance.read_namespaced_deployment(
+            namespace=service_namespace(service), name=str(service["_id"])
+        )
+    except k8s_client.ApiException as e:
+        if e.status != 404:
+            raise
+        deployment = None
+
+    status = deployment.status if deployment else None
+    ready = (status.ready_replicas or 0) if status else 0
+    failed = status is None or any(
+        (condition.type == "Progressing" and condition.status == "False")
+        or (condition.type == "ReplicaFailure" and condition.status == "True")
+        for condition in status.conditions or []
+    )
+    if ready > 0:
+        state = ServiceState.RUNNING
+    elif failed:
+        state = ServiceState.ERROR
+    else:
+        state = ServiceState.PENDING
+    return ServiceRuns(
+        active_runs=ready,
+        succeeded_runs=0,
+        failed_runs=(status.unavailable_replicas or 0) if status else 0,
+        total_runs=(status.replicas or 0) if status else 0,
+        status=state,
+    )
+
+
+def list_services_jobs(
+    services: list[dict], api_instance: k8s_client.BatchV1Api
+) -> dict[str, list[k8s_client.V1Job]]:
+    """Jobs of `services` by service id, with one call per namespace selecting only
+    their ids (persistent services run as Deployments and are skipped)"""
+    service_ids = defaultdict(list)
+    for service in services:
+        if service.get("job_type") != JobType.PERSISTENT:
+            service_ids[service_namespace(service)].append(str(service["_id"]))
+    jobs = defaultdict(list)
+    for namespace, ids in service_ids.items():
+        for job in api_instance.list_namespaced_job(
+            namespace=namespace, label_selector=f"{SERVICE_LABEL} in ({','.join(ids)})"
+        ).items:
+            jobs[job.metadata.labels[SERVICE_LABEL]].append(job)
+    return jobs
+
 
 async def get_service_status(
-    service_id: str, k8s_api_client: k8s_client.ApiClient
-) -> str:
+    service: dict,
+    k8s_api_client: k8s_client.ApiClient,
+    jobs: list[k8s_client.V1Job] | None = None,
+) -> ServiceRuns:
+    """Run counts and status of a service, from `jobs` if they were already listed"""
     api_instance = k8s_client.BatchV1Api(k8s_api_client)
-    namespace = "default"
+    job_type = service.get("job_type")
     try:
-        job = api_instance.read_namespaced_job(
-            namespace=namespace,
-            name=service_id,
-        )
+        if job_type == JobType.PERSISTENT:
+            return deployment_runs(service, k8s_api_client)
+        if jobs is None or (not jobs and job_type != JobType.SCHEDULED):
+            # Not listed, or an ondemand Job without the service label (created
+            # before Jobs were labelled) or already deleted
+            jobs = read_service_jobs(service, api_instance)
 
-        active_runs = job.status.active if job.status.active is not None else 0
-        succeeded_runs = job.status.succeeded if job.status.succeeded is not None else 0
-        failed_runs = job.status.failed if job.status.failed is not None else 0
+        active_runs = sum(job.status.active or 0 for job in jobs)
+        succeeded_runs = sum(job.status.succeeded or 0 for job in jobs)
+        failed_runs = sum(job.status.failed or 0 for job in jobs)
 
         total_runs = succeeded_runs + failed_runs + active_runs
 
         if succeeded_runs > 0 and active_runs == 0 and failed_runs == 0:
-            status = "ok"
+            status = ServiceState.OK
         elif active_runs > 0:
-            status = "running"
+            status = ServiceState.RUNNING
+        elif total_runs == 0 and job_type == JobType.SCHEDULED:
+            status = ServiceState.SCHEDULED
         else:
-            status = "error"
+            status = ServiceState.ERROR
 
-        return dict(
+        return ServiceRuns(
             active_runs=active_runs,
             succeeded_runs=succeeded_runs,
             failed_runs=failed_runs,
             total_runs=total_runs,
             status=status,
         )
-    except ApiException as e:
+    except k8s_client.ApiException as e:
         logger.error(f"Exception when retrieving custom resource status: {e}")
         raise e
 
 
-@router.get("/")
+def service_summary(service: dict, runs: ServiceRuns) -> ServiceSummary:
+    return ServiceSummary(
+        id=str(service["_id"]),
+        namespace=service_namespace(service),
+        image=service.get("image"),
+        version=service.get("version"),
+        description=service.get("description"),
+        reps=service.get("reps"),
+        mount_files=service.get("mount_files"),
+        output_files=service.get("output_files"),
+        created_at=service.get("created_at"),
+        **dict(runs),
+    )
+
+
+@router.get("/", response_model=list[ServiceSummary])
 async def list_services(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
+    namespace: Optional[str] = Query(None),
     db: AgnosticDatabase = Depends(get_orchestrator_database),
-    k8s_api_client: k8s_client.ApiClient = Depends(get_kubernetes_api),
-) -> List[Dict]:
+    k8s_api_client: ApiClient = Depends(get_kubernetes_api),
+):
     services_collection = db.services
+    query = {}
+    if namespace:
+        check_namespace(namespace)
+        query["namespace"] = namespace
+        if namespace == "default":
+            query = {"$or": [query, {"namespace": {"$exists": False}}]}
     services = (
-        await services_collection.find().skip(skip).limit(limit).to_list(length=limit)
+        await services_collection.find(query, SUMMARY_PROJECTION)
+        .skip(skip)
+        .limit(limit)
+        .to_list(length=limit)
     )
     service_list = []
-    
+
+    jobs = list_services_jobs(services, k8s_client.BatchV1Api(k8s_api_client))
     for service in services:
-        service_id = str(service.get("_id"))
-        service_status = await get_service_status(service_id, k8s_api_client)
-        service_record = {
-            "id": service_id,
-            "image": service.get("image"),
-            "version": service.get("version"),
-            "description": service.get("description"),
-            "reps": service.get("reps"),
-            "mount_files": service.get("mount_files"),
-            "output_files": service.get("output_files"),
-            "created_at": service.get("created_at"),
-            **service_status,
-        }
-        service_list.append(service_record)
+        runs = await get_service_status(
+            service, k8s_api_client, jobs.get(str(service["_id"]), [])
+        )
+        service_list.append(service_summary(service, runs))
     logger.info(
         f"Listed {len(service_list)} services with skip={skip} and limit={limit}."
     )
@@ -95,27 +246,26 @@ async def list_services(
 async def launch_service(
     data: ServiceLaunchRequest,
     db: AgnosticDatabase = Depends(get_orchestrator_database),
-    k8s_api_client: k8s_client.ApiClient = Depends(get_kubernetes_api),
+    k8s_api_client: ApiClient = Depends(get_kubernetes_api),
 ):
     """Launch a DT service."""
+    namespace = data.namespace or DEFAULT_NAMESPACE
+    check_namespace(namespace)
     try:
         # TODO
         if data.ana is None:
             logger.error("Implementation for other modules not defined.")
             raise NotImplementedError("Implementation for other modules not defined.")
 
-        # TODO: change this
-        # find a convention for namespaces (namespace per DT Solution?)
-        namespace = "default"
-
         services_collection = db.services
         service_record = {
+            "namespace": namespace,
             "image": data.image,
             "version": data.version,
             "description": data.description,
             "mount_files": data.mount_files,
             "reps": data.ana.reps,
-            "env": data.env,
+            "job_type": data.ana.job_type,
             "env": data.env,
             "created_at": time.time(),
         }
@@ -126,15 +276,39 @@ async def launch_service(
         body = {
             "apiVersion": "eng.cam.ac.uk/v1alpha1",
             "kind": "Analytics",
-            "metadata": {"name": service_id},
+            "metadata": {"name": service_id, "namespace": namespace},
             "spec": {
                 "image": f"{data.image}:{data.version}",
                 "description": data.description,
                 "jobType": data.ana.job_type,
                 "port": data.port,
                 "schedule": data.ana.schedule,
+                "concurrencyPolicy": data.ana.concurrency_policy,
+                "startingDeadlineSeconds": data.ana.starting_deadline_seconds,
+                "successfulJobsHistoryLimit": data.ana.successful_jobs_history_limit,
+                "failedJobsHistoryLimit": data.ana.failed_jobs_history_limit,
                 "reps": data.ana.reps,
+                "minReplicas": data.ana.min_replicas,
+                "maxReplicas": data.ana.max_replicas,
+                "targetCPUUtilizationPercentage": data.ana.target_cpu_utilization,
+                "targetRequestsPerSecond": data.ana.target_requests_per_second,
+                "readinessPath": data.ana.readiness_path,
                 "env": data.env,
+                "resources": (
+                    data.resources.model_dump(exclude_none=True)
+                    if data.resources
+                    else None
+                ),
+                "nodeSelector": data.node_selector,
+                "tolerations": (
+                    [
+                        toleration.model_dump(by_alias=True, exclude_none=True)
+                        for toleration in data.tolerations
+                    ]
+                    if data.tolerations
+                    else None
+                ),
+                "podAntiAffinity": data.pod_anti_affinity,
             },
         }
 
@@ -150,7 +324,7 @@ async def launch_service(
 
         return ServiceLaunchResponse(id=service_id)
 
-    except ApiException as e:
+    except k8s_client.ApiException as e:
         logger.error(f"Exception when creating custom resource: {e}")
         raise HTTPException(
             status_code=e.status, detail=f"Exception when creating custom resource: {e}"
@@ -163,30 +337,33 @@ async def launch_service(
 
 @router.get(
     "/{id}/status",
+    response_model=ServiceStatusResponse,
 )
 async def service_status(
     id: str,
     db: AgnosticDatabase = Depends(get_orchestrator_database),
-    k8s_api_client: k8s_client.ApiClient = Depends(get_kubernetes_api),
+    k8s_api_client: ApiClient = Depends(get_kubernetes_api),
 ):
     """Get the status of a DT service."""
     logger.info("Fetching service status")
     services_collection = db.services
-    service = await services_collection.find_one({"_id": ObjectId(id)})
+    service = await services_collection.find_one(
+        {"_id": ObjectId(id)}, STATUS_PROJECTION
+    )
     if not service:
         raise HTTPException(status_code=404, detail="Service not found in database")
 
-    service_id = str(service.get("_id"))
-    serviceStatus = await get_service_status(service_id, k8s_api_client)
+    runs = await get_service_status(service, k8s_api_client)
 
-    return {
-        "active_runs": serviceStatus.get("active_runs"),
-        "succeeded_runs": serviceStatus.get("succeeded_runs"),
-        "failed_runs": serviceStatus.get("failed_runs"),
-        "total_runs": serviceStatus.get("total_runs"),
-        "status": serviceStatus.get("status"),
-        "output_files": list(service.get("output_files").keys())
-    }
+    return ServiceStatusResponse(
+        namespace=service_namespace(service),
+        # No output was collected yet
+        output_files=list(service.get("output_files") or {}),
+        run_outputs={
+            run: list(files) for run, files in (service.get("run_outputs") or {}).items()
+        },
+        **dict(runs),
+    )
 
 
 @router.get(
@@ -196,8 +373,8 @@ async def service_output(
     id: str,
     idx: int,
     db: AgnosticDatabase = Depends(get_orchestrator_database),
-    k8s_api_client: k8s_client.ApiClient = Depends(get_kubernetes_api),
-    fs: AsyncIOMotorGridFSBucket = Depends(get_gridfs_orchestrator_files),
+    k8s_api_client: ApiClient = Depends(get_kubernetes_api),
+    storage: Storage = Depends(get_storage),
 ):
     """Get the output of a multirun job, if any."""
     logger.info("Fetching service output")
@@ -213,10 +390,8 @@ async def service_output(
 
     data = {}
     try:
-        with tempfile.TemporaryFile("wb+") as tmp:
-            await fs.download_to_stream(ObjectId(requested_file_id), tmp)
-            tmp.seek(0)
-            data = json.load(tmp)
+        content, metadata = await storage.read(ObjectId(requested_file_id))
+        data = json.loads(decompress(content, metadata.get("encoding")))
     except Exception as e:
         logger.error(f"Error downloading file: {e}")
         raise HTTPException(status_code=500, detail="Error downloading file")
@@ -231,15 +406,20 @@ async def service_output(
 async def terminate_service(
     id: str,
     db: AgnosticDatabase = Depends(get_orchestrator_database),
-    k8s_api_client: k8s_client.ApiClient = Depends(get_kubernetes_api),
+    k8s_api_client: ApiClient = Depends(get_kubernetes_api),
+    storage: Storage = Depends(get_storage),
 ):
     """Terminate a DT service."""
     try:
+        services_collection = db.services
+        service = await services_collection.find_one(
+            {"_id": ObjectId(id)}, {"namespace": 1, "mount_files": 1, "output_files": 1}
+        )
         try:
             logger.info("Terminating service")
             # Delete the custom resource from Kubernetes
             api_instance = k8s_client.CustomObjectsApi(k8s_api_client)
-            namespace = "default"  # Change this as needed
+            namespace = service_namespace(service) if service else DEFAULT_NAMESPACE
             api_response = api_instance.delete_namespaced_custom_object(
                 group="eng.cam.ac.uk",
                 version="v1alpha1",
@@ -250,18 +430,20 @@ async def terminate_service(
             )
             logger.info(f"Custom resource with ID {id} deleted from Kubernetes")
 
-        except ApiException as e:
+        except k8s_client.ApiException as e:
             logger.error(f"Exception when deleting custom resource: {e}")
             # raise HTTPException(
             #     status_code=e.status, detail=f"Exception when deleting custom resource: {e}"
             # )
 
         # Delete the service record from MongoDB
-        services_collection = db.services
         result = await services_collection.delete_one({"_id": ObjectId(id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Service not found in database")
         logger.info(f"Service record with ID {id} deleted from MongoDB")
+        await storage.release(
+            [*(service.get("mount_files") or {}), *(service.get("output_files") or {})]
+        )
 
         return {"message": "Service terminated successfully"}
     except Exception as e:
@@ -1,19 +1,26 @@
 import logging
-from typing import Annotated
+import os
+from typing import Annotated, AsyncIterator
 import hashlib
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
-from fastapi.responses import StreamingResponse
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
-from motor.core import AgnosticDatabase
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 
-from ..deps import get_gridfs_orchestrator_files, get_orchestrator_files_database
+from ..compression import accepts_encoding, choose_encoding, compress_file, decompressor
+from ..deps import get_storage
+from ..metrics import UPLOAD_DEDUP_HITS, UPLOADS
+from ..models import FileInfo
+from ..storage import FileNotFound, Storage
 
 router = APIRouter(tags=["files"])
 logger = logging.getLogger(__name__)
 
 
+FILE_INFO_PROJECTION = {"filename": 1, "length": 1, "uploadDate": 1, "metadata": 1}
+
+
 def compute_file_hash(file):
     hasher = hashlib.md5()
     file.seek(0)
@@ -23,24 +30,27 @@ def compute_file_hash(file):
     return hasher.hexdigest()
 
 
-@router.get("/files")
+@router.get("/files", response_model=list[FileInfo])
 async def list_files(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
-    fs: AsyncIOMotorGridFSBucket = Depends(get_gridfs_orchestrator_files),
+    storage: Storage = Depends(get_storage),
 ):
     try:
-        cursor = fs.find().skip(skip).limit(limit)
+        cursor = storage.catalog.find({}, FILE_INFO_PROJECTION).skip(skip).limit(limit)
         files = []
         async for file_doc in cursor:
             files.append(
-                {
-                    "file_id": str(file_doc._id),
-                    "filename": file_doc.filename,
-                    "length": file_doc.length,
-                    "uploadDate": file_doc.uploadDate,
-                    "metadata": file_doc.metadata,
-                }
+                FileInfo(
+                    file_id=str(file_doc["_id"]),
+                    filename=file_doc["filename"],
+                    # Compressed blobs keep the size of the original upload in metadata
+                    length=(file_doc.get("metadata") or {}).get(
+                        "length", file_doc["length"]
+                    ),
+                    uploadDate=file_doc["uploadDate"],
+                    metadata=file_doc.get("metadata"),
+                )
             )
         return files
     except Exception as e:
@@ -50,22 +60,29 @@ async def list_files(
 @router.post("/files/upload")
 async def upload_file(
     file: Annotated[UploadFile, File(description="A file to upload")],
-    files_db: AgnosticDatabase = Depends(get_orchestrator_files_database),
-    fs: AsyncIOMotorGridFSBucket = Depends(get_gridfs_orchestrator_files),
+    storage: Storage = Depends(get_storage),
 ):
     try:
         # Compute the file hash
         file_hash = compute_file_hash(file.file)
         logger.info(f"Computed hash for file {file.filename}: {file_hash}")
+        UPLOADS.inc()
 
         # Check for a file with the same hash
-        existing_file = await files_db['fs.files'].find_one(
+        existing_file = await storage.catalog.find_one(
             {
                 "metadata.hash": file_hash,
             }
         )
 
         if existing_file:
+            UPLOAD_DEDUP_HITS.inc()
+            # Keeps the blob out of garbage collection (if a deleted service had
+            # released it) for the service launch that is likely to reference it
+            await storage.catalog.update_one(
+                {"_id": existing_file['_id']},
+                {"$unset": {"metadata.released_at": ""}},
+            )
             logger.info(
                 f"File {file.filename} already exists with ID {existing_file['_id']}"
             )
@@ -75,9 +92,24 @@ async def upload_file(
                 "message": "File already exists",
             }
 
-        file_id = await fs.upload_from_stream(
-            file.filename, file.file, metadata={"hash": file_hash}
-        )
+        # The hash above stays on the uncompressed content, so dedup is independent
+        # of the codec a file is stored with
+        metadata = {"hash": file_hash}
+        content = file.file
+        encoding = choose_encoding(file.content_type, file.filename, file.size or 0)
+        if encoding:
+            compressed = await run_in_threadpool(compress_file, file.file, encoding)
+            compressed_size = compressed.seek(0, os.SEEK_END)
+            compressed.seek(0)
+            if compressed_size < (file.size or 0):
+                content = compressed
+                metadata.update(encoding=encoding, length=file.size)
+            else:
+                compressed.close()
+
+        file_id = await storage.upload(file.filename, content, metadata)
+        if content is not file.file:
+            content.close()
         logger.info(f"Uploaded file {file.filename} with ID {file_id}")
         return {"file_id": str(file_id), "filename": file.filename}
     except Exception as e:
@@ -87,16 +119,44 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+async def decompress_stream(chunks: AsyncIterator[bytes], encoding: str):
+    decompress_obj = decompressor(encoding)
+    async for chunk in chunks:
+        if data := decompress_obj.decompress(chunk):
+            yield data
+    if data := decompress_obj.flush():
+        yield data
+
+
 @router.get("/files/{file_id}")
 async def get_file(
-    file_id: str, fs: AsyncIOMotorGridFSBucket = Depends(get_gridfs_orchestrator_files)
+    file_id: str,
+    accept_encoding: Annotated[str | None, Header()] = None,
+    storage: Storage = Depends(get_storage),
 ):
     try:
         file_id = ObjectId(file_id)
-        stream = await fs.open_download_stream(file_id)
-        headers = {"Content-Disposition": f"attachment; filename={stream.filename}"}
+        stored = await storage.open(file_id)
+        if stored.path and not await run_in_threadpool(os.path.isfile, stored.path):
+            # Checked up front: a response can't change its status once streaming
+            raise FileNotFound(f"no content for file {file_id}")
+        headers = {"Content-Disposition": f"attachment; filename={stored.filename}"}
+        encoding = stored.metadata.get("encoding")
+        if encoding and not accepts_encoding(accept_encoding, encoding):
+            content = decompress_stream(stored.chunks, encoding)
+        else:
+            # Stored bytes are passed through unchanged
+            content = stored.chunks
+            if encoding:
+                headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+        if stored.path and content is stored.chunks:
+            # Served straight from disk (sendfile where the server supports it)
+            return FileResponse(
+                stored.path, headers=headers, media_type="application/octet-stream"
+            )
         return StreamingResponse(
-            stream, headers=headers, media_type="application/octet-stream"
+            content, headers=headers, media_type="application/octet-stream"
         )
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"File not found: {str(e)}")
@@ -104,11 +164,11 @@ async def get_file(
 
 @router.delete("/files/{file_id}")
 async def delete_file(
-    file_id: str, fs: AsyncIOMotorGridFSBucket = Depends(get_gridfs_orchestrator_files)
+    file_id: str, storage: Storage = Depends(get_storage)
 ):
     try:
         file_id = ObjectId(file_id)
-        await fs.delete(file_id)
+        await storage.delete(file_id)
         return {"message": "File deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"File not found: {str(e)}")
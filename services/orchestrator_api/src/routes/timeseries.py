@@ -0,0 +1,124 @@
+import datetime
+import logging
+import math
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..conf import TIMESERIES_CHUNK_ROWS, TIMESERIES_MAX_WINDOWS
+from ..deps import get_timeseries
+from ..models import TimeseriesFormat, TimeseriesPoint
+from ..timeseries import (
+    ARROW_AVAILABLE,
+    COLUMNS,
+    InfluxError,
+    Row,
+    Timeseries,
+    TimeseriesQuery,
+    arrow_chunks,
+    csv_chunks,
+    window_bounds,
+)
+
+router = APIRouter(tags=["timeseries"])
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    TimeseriesFormat.CSV: "text/csv",
+    TimeseriesFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    """Times without an offset are taken to be UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+async def started(rows: AsyncIterator[Row]) -> AsyncIterator[Row]:
+    """`rows` with its first row read, so that a failed query is answered with an
+    error status rather than a truncated response"""
+    try:
+        first = await anext(rows)
+    except StopAsyncIteration:
+        first = None
+    except InfluxError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    async def resumed():
+        if first is None:
+            return
+        yield first
+        try:
+            async for row in rows:
+                yield row
+        except InfluxError:
+            # Too late for an error status; the client sees the response cut short
+            logger.exception("Time series query failed while streaming")
+            raise
+
+    return resumed()
+
+
+@router.get(
+    "/timeseries/{measurement}/{field}",
+    response_model=list[TimeseriesPoint],
+    responses={
+        200: {
+            "content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+            "description": "Rows in the requested format (csv and arrow are streamed)",
+        }
+    },
+)
+async def query_timeseries(
+    measurement: str,
+    field: str,
+    start: datetime.datetime,
+    stop: Optional[datetime.datetime] = None,
+    every: int = Query(60, ge=1, description="Window length in seconds"),
+    machine: list[str] = Query([], description="Machines to return (default: all)"),
+    format: TimeseriesFormat = TimeseriesFormat.JSON,
+    timeseries: Timeseries = Depends(get_timeseries),
+):
+    """Mean, min, max and count of the readings of `measurement`/`field` (e.g.
+    `temperature_reading`/`temp`) per machine and window of `every` seconds, from
+    `start` until `stop` (default: now). The range is widened to whole windows.
+
+    Large ranges should be requested as csv or arrow (Apache Arrow IPC stream, if
+    pyarrow is installed), which are streamed in chunks."""
+    start = as_utc(start)
+    stop = as_utc(stop) if stop is not None else datetime.datetime.now(datetime.timezone.utc)
+    if stop <= start:
+        raise HTTPException(status_code=400, detail="stop must be after start")
+    windows = math.ceil((stop - start).total_seconds() / every)
+    if windows > TIMESERIES_MAX_WINDOWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The range spans {windows} windows (at most {TIMESERIES_MAX_WINDOWS}), use a longer window",
+        )
+    if format == TimeseriesFormat.ARROW and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=406, detail="Arrow output requires pyarrow")
+
+    start, stop = window_bounds(start, stop, every)
+    query = TimeseriesQuery(
+        measurement=measurement,
+        field=field,
+        start=start,
+        stop=stop,
+        every=every,
+        # Sorted so that the same machines share a cache entry
+        machines=tuple(sorted(set(machine))),
+    )
+    rows = await started(timeseries.rows(query))
+
+    if format == TimeseriesFormat.JSON:
+        try:
+            return [dict(zip(COLUMNS, row)) async for row in rows]
+        except InfluxError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+    chunks = csv_chunks if format == TimeseriesFormat.CSV else arrow_chunks
+    return StreamingResponse(
+        chunks(rows, TIMESERIES_CHUNK_ROWS), media_type=MEDIA_TYPES[format]
+    )
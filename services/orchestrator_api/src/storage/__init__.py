@@ -0,0 +1,152 @@
+"""Blob storage for the `/files` routes.
+
+File metadata (filename, length, upload date, hash, encoding) always lives in the
+`fs.files` collection of the `orchestrator_files` database, which keeps listing,
+deduplication and garbage collection independent of where the bytes are. The bytes
+are stored by one of the backends, recorded per file as `metadata.backend`
+(missing for files written before backends existed, i.e. GridFS):
+
+  gridfs => GridFS chunks in MongoDB (the `fs.files` document doubles as the metadata).
+  filesystem => one file per blob under a local/PVC directory, served with `FileResponse`.
+  s3 => objects in an S3-compatible bucket (e.g. MinIO).
+
+New uploads go to `STORAGE_BACKEND`; reads and deletes go to the backend a file was
+stored with, so backends can be switched (and blobs migrated) without downtime."""
+
+import datetime
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO
+
+from bson import ObjectId
+from motor.core import AgnosticDatabase
+
+from ..conf import STORAGE_BACKEND
+from ..metrics import GRIDFS_BYTES, STORAGE_BYTES
+from .base import BlobBackend, FileNotFound
+
+BACKENDS = ("gridfs", "filesystem", "s3")
+
+
+@dataclass
+class StoredFile:
+    file_id: ObjectId
+    filename: str
+    length: int
+    backend: str
+    chunks: AsyncIterator[bytes]
+    metadata: dict = field(default_factory=dict)
+    path: str | None = None
+    """Local path of the blob, if the backend has one (enables zero-copy responses)"""
+
+
+def create_backend(name: str, database: AgnosticDatabase) -> BlobBackend:
+    if name == "gridfs":
+        from .gridfs_store import GridFSBackend
+
+        return GridFSBackend(database)
+    if name == "filesystem":
+        from .filesystem_store import FilesystemBackend
+
+        return FilesystemBackend()
+    if name == "s3":
+        from .s3_store import S3Backend
+
+        return S3Backend()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def record_bytes(backend: str, direction: str, length: int):
+    STORAGE_BYTES.labels(backend=backend, direction=direction).inc(length)
+    if backend == "gridfs":
+        GRIDFS_BYTES.labels(direction=direction).inc(length)
+
+
+class Storage:
+    """Metadata catalog plus the blob backends"""
+
+    def __init__(self, database: AgnosticDatabase, default_backend: str = STORAGE_BACKEND):
+        self.database = database
+        self.catalog = database["fs.files"]
+        self.default_backend = default_backend
+        self.backends: dict[str, BlobBackend] = {}
+
+    def backend(self, name: str) -> BlobBackend:
+        if name not in self.backends:
+            self.backends[name] = create_backend(name, self.database)
+        return self.backends[name]
+
+    async def upload(
+        self,
+        filename: str,
+        content: BinaryIO,
+        metadata: dict,
+        backend: str | None = None,
+        file_id: ObjectId | None = None,
+        upload_date: datetime.datetime | None = None,
+    ) -> ObjectId:
+        name = backend or self.default_backend
+        file_id = file_id or ObjectId()
+        metadata = dict(metadata)
+        if name != "gridfs":
+            metadata["backend"] = name
+        else:
+            metadata.pop("backend", None)
+
+        store = self.backend(name)
+        length = await store.put(file_id, filename, content, metadata)
+        if not store.writes_catalog:
+            await self.catalog.insert_one(
+                {
+                    "_id": file_id,
+                    "filename": filename,
+                    "length": length,
+                    "uploadDate": upload_date
+                    or datetime.datetime.now(datetime.timezone.utc),
+                    "metadata": metadata,
+                }
+            )
+        record_bytes(name, "in", length)
+        return file_id
+
+    async def open(self, file_id: ObjectId) -> StoredFile:
+        doc = await self.catalog.find_one({"_id": file_id})
+        if not doc:
+            raise FileNotFound(f"no file with id {file_id}")
+        metadata = doc.get("metadata") or {}
+        name = metadata.get("backend", "gridfs")
+        store = self.backend(name)
+        record_bytes(name, "out", doc["length"])
+        return StoredFile(
+            file_id=file_id,
+            filename=doc["filename"],
+            length=doc["length"],
+            backend=name,
+            chunks=store.chunks(file_id),
+            metadata=metadata,
+            path=store.local_path(file_id),
+        )
+
+    async def read(self, file_id: ObjectId) -> tuple[bytes, dict]:
+        """Whole (stored) content of a file and its metadata"""
+        stored = await self.open(file_id)
+        return b"".join([chunk async for chunk in stored.chunks]), stored.metadata
+
+    async def release(self, file_ids: list[str]):
+        """Mark files no longer referenced by a (deleted) service, which makes them
+        candidates for the operator's garbage collection"""
+        ids = [ObjectId(file_id) for file_id in file_ids if ObjectId.is_valid(file_id)]
+        if ids:
+            await self.catalog.update_many(
+                {"_id": {"$in": ids}},
+                {"$set": {"metadata.released_at": datetime.datetime.now(datetime.timezone.utc)}},
+            )
+
+    async def delete(self, file_id: ObjectId):
+        doc = await self.catalog.find_one({"_id": file_id}, {"metadata.backend": 1})
+        if not doc:
+            raise FileNotFound(f"no file with id {file_id}")
+        store = self.backend((doc.get("metadata") or {}).get("backend", "gridfs"))
+        await store.remove(file_id)
+        # GridFS removes its own files document
+        if not store.writes_catalog:
+            await self.catalog.delete_one({"_id": file_id})
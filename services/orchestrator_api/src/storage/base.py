@@ -0,0 +1,30 @@
+import abc
+from typing import AsyncIterator, BinaryIO
+
+from bson import ObjectId
+
+
+class FileNotFound(Exception):
+    pass
+
+
+class BlobBackend(abc.ABC):
+    writes_catalog: bool = False
+    """Whether `put` also writes the file's `fs.files` metadata document"""
+
+    @abc.abstractmethod
+    async def put(
+        self, file_id: ObjectId, filename: str, content: BinaryIO, metadata: dict
+    ) -> int:
+        """Store `content` (read to its end) under `file_id`, returning the stored length"""
+
+    @abc.abstractmethod
+    def chunks(self, file_id: ObjectId) -> AsyncIterator[bytes]:
+        """Stored content of a file"""
+
+    @abc.abstractmethod
+    async def remove(self, file_id: ObjectId):
+        """Delete the stored content of a file"""
+
+    def local_path(self, file_id: ObjectId) -> str | None:
+        return None
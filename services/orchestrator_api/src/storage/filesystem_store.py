@@ -0,0 +1,54 @@
+import os
+import shutil
+from typing import AsyncIterator, BinaryIO
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from ..conf import FILESYSTEM_STORAGE_ROOT, STORAGE_CHUNK_SIZE
+from .base import BlobBackend, FileNotFound
+
+
+class FilesystemBackend(BlobBackend):
+    """Blobs as files on a local or PVC-mounted directory, sharded by the last two
+    characters of the id to keep directories small"""
+
+    def __init__(self, root: str = FILESYSTEM_STORAGE_ROOT):
+        self.root = root
+
+    def local_path(self, file_id: ObjectId) -> str:
+        name = str(file_id)
+        return os.path.join(self.root, name[-2:], name)
+
+    def write(self, file_id: ObjectId, content: BinaryIO) -> int:
+        path = self.local_path(file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so readers never see a partial blob
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(content, f, STORAGE_CHUNK_SIZE)
+            length = f.tell()
+        os.replace(tmp_path, path)
+        return length
+
+    async def put(
+        self, file_id: ObjectId, filename: str, content: BinaryIO, metadata: dict
+    ) -> int:
+        return await run_in_threadpool(self.write, file_id, content)
+
+    async def chunks(self, file_id: ObjectId) -> AsyncIterator[bytes]:
+        try:
+            f = await run_in_threadpool(open, self.local_path(file_id), "rb")
+        except FileNotFoundError as e:
+            raise FileNotFound(str(e))
+        try:
+            while chunk := await run_in_threadpool(f.read, STORAGE_CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+
+    async def remove(self, file_id: ObjectId):
+        try:
+            await run_in_threadpool(os.remove, self.local_path(file_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,57 @@
+from typing import AsyncIterator, BinaryIO
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.core import AgnosticDatabase
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from ..conf import STORAGE_CHUNK_SIZE
+from .base import BlobBackend, FileNotFound
+
+
+class GridFSBackend(BlobBackend):
+    writes_catalog = True
+
+    def __init__(self, database: AgnosticDatabase):
+        self.database = database
+        self.bucket = AsyncIOMotorGridFSBucket(database, chunk_size_bytes=STORAGE_CHUNK_SIZE)
+
+    async def put(
+        self, file_id: ObjectId, filename: str, content: BinaryIO, metadata: dict
+    ) -> int:
+        start = content.tell()
+        await self.bucket.upload_from_stream_with_id(
+            file_id, filename, content, metadata=metadata
+        )
+        return content.tell() - start
+
+    async def put_chunks(self, file_id: ObjectId, content: BinaryIO) -> int:
+        """Store `content` as the chunks of `file_id` without writing its `fs.files`
+        document (used when migrating a file into GridFS, where the existing document
+        stays the catalog entry). Chunks left by an interrupted attempt are replaced."""
+        await self.remove_chunks(file_id)
+        length = 0
+        n = 0
+        while data := content.read(STORAGE_CHUNK_SIZE):
+            await self.database["fs.chunks"].insert_one(
+                {"files_id": file_id, "n": n, "data": data}
+            )
+            length += len(data)
+            n += 1
+        return length
+
+    async def chunks(self, file_id: ObjectId) -> AsyncIterator[bytes]:
+        try:
+            stream = await self.bucket.open_download_stream(file_id)
+        except NoFile as e:
+            raise FileNotFound(str(e))
+        while chunk := await stream.readchunk():
+            yield chunk
+
+    async def remove(self, file_id: ObjectId):
+        await self.bucket.delete(file_id)
+
+    async def remove_chunks(self, file_id: ObjectId):
+        """Delete the content but keep the `fs.files` document (used when migrating
+        a file to another backend, where the document remains the metadata)"""
+        await self.database["fs.chunks"].delete_many({"files_id": file_id})
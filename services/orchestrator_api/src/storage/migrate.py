@@ -0,0 +1,132 @@
+"""Move blobs between storage backends.
+
+    python -m src.storage.migrate --to filesystem [--from gridfs] [--batch-size 100]
+
+Files are copied one at a time; each is switched over (`metadata.backend`) only once
+its content is in the new backend, and only then removed from the old one, so the API
+can keep serving while a migration runs and an interrupted run can simply be
+restarted. Content migrated into GridFS is written as chunks of the existing catalog
+entry, which is never replaced.
+
+A switched file records its old backend as `metadata.migrated_from` until its content
+there is removed; a rerun first finishes the files an interrupted run left in that
+state."""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+
+from bson import ObjectId
+
+from ..conf import STORAGE_CHUNK_SIZE
+from ..deps import create_mongo_client
+from . import BACKENDS, Storage
+from .gridfs_store import GridFSBackend
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def backend_filter(name: str) -> dict:
+    if name == "gridfs":
+        return {"metadata.backend": {"$exists": False}}
+    return {"metadata.backend": name}
+
+
+async def migrate(source: str | None, target: str, batch_size: int) -> int:
+    client = create_mongo_client()
+    storage = Storage(client.orchestrator_files, default_backend=target)
+    query = {"$nor": [backend_filter(target)]}
+    if source:
+        query = backend_filter(source)
+    migrated = 0
+    last_id = None
+    try:
+        async for doc in storage.catalog.find(
+            {"metadata.migrated_from": {"$exists": True}}, {"metadata.migrated_from": 1}
+        ):
+            logger.info(f"Removing {doc['_id']} from {doc['metadata']['migrated_from']}")
+            await remove_source(storage, doc["_id"], doc["metadata"]["migrated_from"])
+        while True:
+            batch_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+            batch = (
+                await storage.catalog.find(batch_query, {"_id": 1})
+                .sort("_id", 1)
+                .limit(batch_size)
+                .to_list(None)
+            )
+            if not batch:
+                return migrated
+            for doc in batch:
+                await migrate_file(storage, doc["_id"], target)
+                migrated += 1
+            last_id = batch[-1]["_id"]
+            logger.info(f"Migrated {migrated} files to {target}")
+    finally:
+        client.close()
+
+
+async def migrate_file(storage: Storage, file_id: ObjectId, target: str):
+    stored = await storage.open(file_id)
+    store = storage.backend(target)
+    metadata = {k: v for k, v in stored.metadata.items() if k != "backend"}
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as content:
+        async for chunk in stored.chunks:
+            content.write(chunk)
+        content.seek(0)
+        if isinstance(store, GridFSBackend):
+            # Readers use the source backend until the catalog entry is switched below
+            length = await store.put_chunks(file_id, content)
+            switch = {
+                "$set": {
+                    "length": length,
+                    "chunkSize": STORAGE_CHUNK_SIZE,
+                    "metadata.migrated_from": stored.backend,
+                },
+                "$unset": {"metadata.backend": ""},
+            }
+        else:
+            await store.put(file_id, stored.filename, content, metadata)
+            switch = {
+                "$set": {"metadata.backend": target, "metadata.migrated_from": stored.backend}
+            }
+
+    await storage.catalog.update_one({"_id": file_id}, switch)
+    await remove_source(storage, file_id, stored.backend)
+
+
+async def remove_source(storage: Storage, file_id: ObjectId, backend: str):
+    """Remove the content a file was migrated from"""
+    source = storage.backend(backend)
+    if isinstance(source, GridFSBackend):
+        # The files document stays: it is the catalog entry
+        await source.remove_chunks(file_id)
+    else:
+        await source.remove(file_id)
+    await storage.catalog.update_one(
+        {"_id": file_id}, {"$unset": {"metadata.migrated_from": ""}}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move blobs between storage backends")
+    parser.add_argument("--to", dest="target", required=True, choices=BACKENDS)
+    parser.add_argument(
+        "--from",
+        dest="source",
+        choices=BACKENDS,
+        help="only migrate files stored in this backend (default: all others)",
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("--from and --to must be different backends")
+    logging.basicConfig(level=logging.INFO)
+    migrated = asyncio.run(migrate(args.source, args.target, args.batch_size))
+    logger.info(f"Done: {migrated} files migrated to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from typing import AsyncIterator, BinaryIO
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # optional dependency
+    boto3 = None
+
+from ..conf import (
+    S3_ACCESS_KEY_ID,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+    S3_SECRET_ACCESS_KEY,
+    STORAGE_CHUNK_SIZE,
+)
+from .base import BlobBackend, FileNotFound
+
+
+class CountingReader:
+    """Read-only view of a file counting the bytes read through it"""
+
+    def __init__(self, content: BinaryIO):
+        self.content = content
+        self.length = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.content.read(size)
+        self.length += len(data)
+        return data
+
+
+class S3Backend(BlobBackend):
+    """Blobs as objects in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    def __init__(self):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for the s3 storage backend")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL,
+            region_name=S3_REGION,
+            aws_access_key_id=S3_ACCESS_KEY_ID,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+        )
+        self.bucket = S3_BUCKET
+
+    async def put(
+        self, file_id: ObjectId, filename: str, content: BinaryIO, metadata: dict
+    ) -> int:
+        # Counted while streaming: boto3 may close `content` once uploaded
+        reader = CountingReader(content)
+        await run_in_threadpool(
+            self.client.upload_fileobj, reader, self.bucket, str(file_id)
+        )
+        return reader.length
+
+    async def chunks(self, file_id: ObjectId) -> AsyncIterator[bytes]:
+        try:
+            response = await run_in_threadpool(
+                self.client.get_object, Bucket=self.bucket, Key=str(file_id)
+            )
+        except ClientError as e:
+            raise FileNotFound(str(e))
+        body = response["Body"]
+        try:
+            while chunk := await run_in_threadpool(body.read, STORAGE_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def remove(self, file_id: ObjectId):
+        await run_in_threadpool(
+            self.client.delete_object, Bucket=self.bucket, Key=str(file_id)
+        )
@@ -0,0 +1,345 @@
+"""Downsampled queries of the sensor time series in InfluxDB.
+
+Telegraf writes the readings of each sensor feed as a measurement and field (e.g.
+`temperature_reading`/`temp`), tagged with the `machine` and with the `host` of the
+Telegraf pod, so a machine has one series per Telegraf pod that has written it.
+
+Queries are aggregated by InfluxDB rather than here. The count, sum, min and max of
+each window are computed per series by the storage engine (an `aggregateWindow`
+directly after `range` and `filter` is pushed down), then combined per machine, so
+only one row per machine and window is sent back. The mean is sum/count, weighted by
+the readings of each series.
+
+Results are read as CSV from the query API and split a line at a time, so rows can be
+streamed to clients as InfluxDB produces them. Values are kept as InfluxDB formatted
+them: CSV responses pass them through, JSON responses convert them while validating
+the response model and Arrow responses a column at a time.
+
+Results of recent queries are cached per worker for TIMESERIES_CACHE_TTL seconds,
+and concurrent requests for a query in flight wait for its result. Window bounds are
+aligned to the window length, so that e.g. dashboards polling the last hour share a
+query until the next window starts."""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import datetime
+import importlib.util
+import io
+import math
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator
+
+from .conf import (
+    INFLUXDB_BUCKET,
+    INFLUXDB_ORG,
+    INFLUXDB_TIMEOUT,
+    INFLUXDB_TOKEN,
+    INFLUXDB_URL,
+    TIMESERIES_CACHE_ENTRIES,
+    TIMESERIES_CACHE_MAX_ROWS,
+    TIMESERIES_CACHE_TTL,
+)
+from .metrics import TIMESERIES_QUERIES
+
+if TYPE_CHECKING:
+    import httpx
+
+COLUMNS = ("time", "machine", "mean", "min", "max", "count")
+# Values of COLUMNS as formatted by InfluxDB (RFC 3339 start of the window, machine or
+# None, numbers)
+Row = tuple[str, str | None, str, str, str, str]
+
+# Arrow output needs pyarrow (optional dependency), imported on first use as it is slow
+# to import
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+class InfluxError(Exception):
+    """InfluxDB couldn't be reached or failed a query"""
+
+
+def flux_string(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("${", "\\${")
+    return f'"{escaped}"'
+
+
+def flux_time(value: datetime.datetime) -> str:
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def window_bounds(
+    start: datetime.datetime, stop: datetime.datetime, every: int
+) -> tuple[datetime.datetime, datetime.datetime]:
+    """`start` and `stop` widened to the bounds of the (epoch aligned) windows they fall
+    in, so that the first and last windows are complete"""
+    start_s = math.floor(start.timestamp() / every) * every
+    stop_s = math.ceil(stop.timestamp() / every) * every
+    return (
+        datetime.datetime.fromtimestamp(start_s, datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(stop_s, datetime.timezone.utc),
+    )
+
+
+@dataclass(frozen=True)
+class TimeseriesQuery:
+    measurement: str
+    field: str
+    start: datetime.datetime
+    stop: datetime.datetime
+    every: int
+    """Window length in seconds"""
+
+    machines: tuple[str, ...] = ()
+    """Machines to return (all when empty)"""
+
+    def flux(self, bucket: str = INFLUXDB_BUCKET) -> str:
+        machine_filter = ""
+        if self.machines:
+            machines = " or ".join(f"r.machine == {flux_string(m)}" for m in self.machines)
+            machine_filter = f"\n  |> filter(fn: (r) => {machines})"
+        every = f"{self.every}s"
+        return f"""data = from(bucket: {flux_string(bucket)})
+  |> range(start: {flux_time(self.start)}, stop: {flux_time(self.stop)})
+  |> filter(fn: (r) => r._measurement == {flux_string(self.measurement)} and r._field == {flux_string(self.field)}){machine_filter}
+
+// Aggregated per series by the storage engine, then combined per machine
+windows = (fn, combine, column) => data
+  |> aggregateWindow(every: {every}, fn: fn, timeSrc: "_start", createEmpty: false)
+  |> toFloat()
+  |> group(columns: ["machine"])
+  |> aggregateWindow(every: {every}, fn: combine, timeSrc: "_start", createEmpty: false)
+  |> set(key: "_field", value: column)
+
+union(tables: [
+    windows(fn: count, combine: sum, column: "count"),
+    windows(fn: sum, combine: sum, column: "sum"),
+    windows(fn: min, combine: min, column: "min"),
+    windows(fn: max, combine: max, column: "max"),
+])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> map(fn: (r) => ({{_time: r._time, machine: r.machine, mean: r.sum / r.count, min: r.min, max: r.max, count: int(v: r.count)}}))
+  |> group()
+"""
+
+
+async def parse_rows(lines: AsyncIterator[str]) -> AsyncIterator[Row]:
+    """Rows of a query response in CSV without annotations (each table, or run of
+    tables with the same columns, starts with a header after an empty line)"""
+    header = None
+    async for line in lines:
+        if not line.strip():
+            header = None
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = {name: index for index, name in enumerate(values)}
+            indices = [header.get(name) for name in ("_time", "machine", *COLUMNS[2:])]
+            continue
+        if "error" in header:
+            raise InfluxError(f"InfluxDB query failed: {values[header['error']]}")
+        time_, machine, *numbers = (
+            values[index] if index is not None else None for index in indices
+        )
+        yield (time_, machine or None, *numbers)
+
+
+class InfluxClient:
+    """Flux queries over the InfluxDB v2 HTTP API"""
+
+    def __init__(
+        self,
+        url: str = INFLUXDB_URL,
+        token: str = INFLUXDB_TOKEN,
+        org: str = INFLUXDB_ORG,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        # Imported when the app lifespan creates the client rather than with this
+        # module, to keep it out of the import time
+        import httpx
+
+        self.org = org
+        self.http = httpx.AsyncClient(
+            base_url=url,
+            headers={"Authorization": f"Token {token}"} if token else None,
+            timeout=INFLUXDB_TIMEOUT,
+            transport=transport,
+        )
+
+    async def query(self, flux: str) -> AsyncIterator[Row]:
+        import httpx
+
+        try:
+            async with self.http.stream(
+                "POST",
+                "/api/v2/query",
+                params={"org": self.org},
+                json={
+                    "query": flux,
+                    "type": "flux",
+                    "dialect": {"header": True, "annotations": [], "delimiter": ","},
+                },
+                headers={"Accept": "application/csv", "Accept-Encoding": "gzip"},
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    try:
+                        message = response.json().get("message")
+                    except ValueError:
+                        message = response.text
+                    raise InfluxError(
+                        f"InfluxDB query failed ({response.status_code}): {message}"
+                    )
+                async for row in parse_rows(response.aiter_lines()):
+                    yield row
+        except httpx.HTTPError as e:
+            raise InfluxError(f"InfluxDB request failed: {e!r}") from e
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class WindowCache:
+    """Rows of recent queries, kept for `ttl` seconds (least recently used evicted first
+    beyond `max_entries`)"""
+
+    def __init__(self, ttl: float, max_entries: int, max_rows: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.entries: OrderedDict[TimeseriesQuery, tuple[float, list[Row]]] = OrderedDict()
+
+    def get(self, query: TimeseriesQuery) -> list[Row] | None:
+        entry = self.entries.get(query)
+        if entry is None:
+            return None
+        expires, rows = entry
+        if expires < time.monotonic():
+            del self.entries[query]
+            return None
+        self.entries.move_to_end(query)
+        return rows
+
+    def put(self, query: TimeseriesQuery, rows: list[Row]):
+        if self.ttl <= 0 or len(rows) > self.max_rows:
+            return
+        self.entries[query] = (time.monotonic() + self.ttl, rows)
+        self.entries.move_to_end(query)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class Timeseries:
+    """Downsampled queries, answered from the cache when possible"""
+
+    def __init__(self, client: InfluxClient | None = None, bucket: str = INFLUXDB_BUCKET):
+        self.client = client or InfluxClient()
+        self.bucket = bucket
+        self.cache = WindowCache(
+            TIMESERIES_CACHE_TTL, TIMESERIES_CACHE_ENTRIES, TIMESERIES_CACHE_MAX_ROWS
+        )
+        # Queries sent to InfluxDB and not complete yet
+        self.pending: dict[TimeseriesQuery, asyncio.Event] = {}
+
+    async def rows(self, query: TimeseriesQuery) -> AsyncIterator[Row]:
+        pending = self.pending.get(query)
+        if pending is not None:
+            # e.g. dashboards refreshing at the same time; answered from the cache once
+            # the query completes (queried again if its result is too large to cache)
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(pending.wait(), INFLUXDB_TIMEOUT)
+        cached = self.cache.get(query)
+        if cached is not None:
+            TIMESERIES_QUERIES.labels(cache="hit").inc()
+            for row in cached:
+                yield row
+            return
+
+        TIMESERIES_QUERIES.labels(cache="miss").inc()
+        done = self.pending.setdefault(query, asyncio.Event())
+        try:
+            # Kept while the result is small enough to cache (and only once complete,
+            # as the client may go away mid-stream)
+            kept = []
+            async for row in self.client.query(query.flux(self.bucket)):
+                if kept is not None:
+                    kept.append(row)
+                    if len(kept) > self.cache.max_rows:
+                        kept = None
+                yield row
+            if kept is not None:
+                self.cache.put(query, kept)
+        finally:
+            if self.pending.get(query) is done:
+                del self.pending[query]
+                done.set()
+
+    async def close(self):
+        await self.client.close()
+
+
+async def batched(rows: AsyncIterator[Row], size: int) -> AsyncIterator[list[Row]]:
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def csv_chunks(rows: AsyncIterator[Row], chunk_rows: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for batch in batched(rows, chunk_rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Just the header when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def arrow_chunks(rows: AsyncIterator[Row], chunk_rows: int) -> AsyncIterator[bytes]:
+    """Arrow IPC stream with a record batch per `chunk_rows` rows"""
+    import pyarrow
+
+    schema = pyarrow.schema(
+        [
+            ("time", pyarrow.timestamp("s", tz="UTC")),
+            ("machine", pyarrow.string()),
+            ("mean", pyarrow.float64()),
+            ("min", pyarrow.float64()),
+            ("max", pyarrow.float64()),
+            ("count", pyarrow.int64()),
+        ]
+    )
+    sink = io.BytesIO()
+
+    def written() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        async for batch in batched(rows, chunk_rows):
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [
+                        pyarrow.array(column, type=pyarrow.string()).cast(field.type)
+                        for column, field in zip(zip(*batch), schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield written()
+    # The schema (if there were no rows) and the end of stream marker
+    yield written()
@@ -0,0 +1,4 @@
+"""Instrumentation shared by the orchestrator operator and API.
+
+The metrics themselves are defined by each service (their names carry the service's
+prefix) and passed in."""
@@ -0,0 +1,58 @@
+import time
+from urllib.parse import urlsplit
+
+from kubernetes import client as k8s_client
+from prometheus_client import Histogram
+
+
+def resource_template(path: str) -> str:
+    """Kubernetes API path with namespace and object name replaced by placeholders,
+    which keeps the label cardinality bounded.
+
+    `/apis/batch/v1/namespaces/default/jobs/abc` -> `/apis/batch/v1/namespaces/{namespace}/jobs/{name}`
+    """
+    segments = path.split("/")
+    # ["", "api", "v1", ...] or ["", "apis", group, version, ...]
+    start = 3 if len(segments) > 1 and segments[1] == "api" else 4
+    rest = segments[start:]
+    if len(rest) > 1 and rest[0] == "namespaces":
+        rest[1] = "{namespace}"
+        name_index = 3
+    else:
+        name_index = 1
+    if len(rest) > name_index:
+        rest[name_index] = "{name}"
+    return "/".join(segments[:start] + rest)
+
+
+def call_method_and_path(args: tuple, kwargs: dict) -> tuple[str, str]:
+    """HTTP method and API path of a `call_api` call.
+
+    Older clients call `call_api(resource_path, method, ...)`, newer ones
+    `call_api(method, url, ...)`; either may be passed by keyword."""
+    if "resource_path" in kwargs or (args and str(args[0]).startswith("/")):
+        path = kwargs.get("resource_path", args[0] if args else "")
+        method = kwargs.get("method", args[1] if len(args) > 1 else "")
+    else:
+        method = kwargs.get("method", args[0] if args else "")
+        path = urlsplit(kwargs.get("url", args[1] if len(args) > 1 else "")).path
+    return method or "unknown", path
+
+
+class InstrumentedApiClient(k8s_client.ApiClient):
+    """Kubernetes API client recording the latency of every call in `duration`
+    (labelled `method` and `path`)"""
+
+    def __init__(self, duration: Histogram, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.duration = duration
+
+    def call_api(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().call_api(*args, **kwargs)
+        finally:
+            method, path = call_method_and_path(args, kwargs)
+            self.duration.labels(method=method, path=resource_template(path)).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from prometheus_client import PROCESS_COLLECTOR, Histogram
+from pymongo import monitoring
+
+IMPORTED_AT = time.time()
+
+
+def process_start_time() -> float:
+    """Start time of the process, as exported in `process_start_time_seconds`. That
+    metric is only available on Linux; elsewhere the time this module was imported
+    is returned instead."""
+    for family in PROCESS_COLLECTOR.collect():
+        if family.name == "process_start_time_seconds":
+            return family.samples[0].value
+    return IMPORTED_AT
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records the latency of every MongoDB command by command name in `duration`
+    (labelled `command` and `outcome`)"""
+
+    def __init__(self, duration: Histogram):
+        self.duration = duration
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.duration.labels(command=event.command_name, outcome="succeeded").observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.duration.labels(command=event.command_name, outcome="failed").observe(
+            event.duration_micros / 1e6
+        )
+
+
+async def monitor_event_loop_lag(lag: Histogram, interval: float = 0.5):
+    """Periodically measure how late the event loop wakes up a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, loop.time() - start - interval))